@@ -3,18 +3,16 @@ import sys
 import json
 from django.conf import settings
 from agentic_app.utils.db import save_agent_output
-from agentic_app.utils.llm import initialize_gemini
+from agentic_app.utils.llm import generate_json, stream_json
 
 # Ensure the backend directory is in the Python path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if BASE_DIR not in sys.path:
     sys.path.append(BASE_DIR)
 
-def generate_epics_and_stories(features, project_id):
-    """Generate epics and user stories from features in Gherkin/SMART format."""
-    try:
-        model = initialize_gemini()
-        prompt = f"""
+def build_epics_prompt(features):
+    """Construct the epics and user stories prompt for features."""
+    return f"""
 You are an AI assistant generating epics and user stories for Agile development.
 Given the features below, provide a JSON output with:
 - epics: A list of 1-2 epics, each with a name and description (20 words max).
@@ -31,23 +29,30 @@ Output in JSON format:
 }}
 ```
 """
-        from langchain_core.prompts import ChatPromptTemplate
-        prompt_template = ChatPromptTemplate.from_messages([("human", "{prompt}")])
-        chain = prompt_template | model
-        response = chain.invoke({"prompt": prompt})
-        
-        # Strip ```json markers
-        import re
-        content = re.sub(r'^```json\n|\n```$', '', response.content, flags=re.MULTILINE).strip()
-        
-        # Parse JSON
-        try:
-            output = json.loads(content)
-        except json.JSONDecodeError:
-            raise ValueError(f"Failed to parse LLM output as JSON: {content}")
-        
+
+def generate_epics_and_stories(features, project_id, use_cache=True, input_hash=None):
+    """Generate epics and user stories from features in Gherkin/SMART format."""
+    try:
+        prompt = build_epics_prompt(features)
+        # Invoke (or serve from the response cache) and parse JSON
+        output = generate_json(prompt, use_cache=use_cache)
+
         # Save to MongoDB
-        save_agent_output(project_id, "epic_agent", output)
+        save_agent_output(project_id, "epic_agent", output, input_hash)
         return output
     except Exception as e:
-        raise ValueError(f"Failed to generate epics and stories: {e}")
\ No newline at end of file
+        raise ValueError(f"Failed to generate epics and stories: {e}")
+
+def stream_epics_and_stories(features, project_id, use_cache=True):
+    """Streaming variant of generate_epics_and_stories.
+
+    Yields ("token", text) events while Gemini generates, then saves the
+    parsed output and yields it as a final ("result", output) event.
+    """
+    try:
+        for event, data in stream_json(build_epics_prompt(features), use_cache=use_cache):
+            if event == "result":
+                save_agent_output(project_id, "epic_agent", data)
+            yield event, data
+    except Exception as e:
+        raise ValueError(f"Failed to generate epics and stories: {e}")
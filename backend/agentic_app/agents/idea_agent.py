@@ -1,17 +1,26 @@
 import os
 import sys
 import json
+import time
+import threading
 import markdown
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from agentic_app.utils.db import get_project_data, save_agent_output
-from agentic_app.utils.rag import FAISSRAG
-from agentic_app.utils.llm import generate_idea_analysis
+from agentic_app.utils.rag import get_rag, rebuild_index_async
+from agentic_app.utils.llm import generate_idea_analysis, stream_idea_analysis
 
 # Ensure the backend directory is in the Python path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if BASE_DIR not in sys.path:
     sys.path.append(BASE_DIR)
 
+# Used while the playbook index is still being built, or if retrieval fails
+PLAYBOOK_FALLBACK_CONTEXT = """Use Agile methodology best practices.
+Derive features from user needs: start from personas and the outcomes they want,
+group related capabilities into epics, and keep each feature small enough to be
+delivered and validated within a sprint. Prioritise by business value and risk."""
+
 def generate_use_case_map(features, personas):
     """Generate a Markdown use-case map from features and personas."""
     md_content = "# Use-Case Map\n\n"
@@ -23,38 +32,131 @@ def generate_use_case_map(features, personas):
         md_content += f"- **{feature['name']}**: {feature['description']}\n"
     return md_content
 
-def process_idea(project_id, idea, team_metadata):
-    """Process a product idea and generate structured output."""
+PLAYBOOK_QUERY = "how to extract features in Agile methodology"
+
+# The playbook context depends only on PLAYBOOK_QUERY and the index, so it is
+# computed once per published index version
+_playbook_context = (None, None)
+
+# Persistence and file output run on a small executor, concurrently with each
+# other and (by default) after the response has been returned
+_side_effect_executor = None
+_side_effect_pid = None
+_side_effect_lock = threading.Lock()
+
+def _get_side_effect_executor():
+    """Return this process's side-effect executor; threads do not survive a fork."""
+    global _side_effect_executor, _side_effect_pid
+    with _side_effect_lock:
+        if _side_effect_executor is None or _side_effect_pid != os.getpid():
+            _side_effect_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "IDEA_SIDE_EFFECT_WORKERS", 4),
+                thread_name_prefix='idea-side-effects',
+            )
+            _side_effect_pid = os.getpid()
+        return _side_effect_executor
+
+def _timed(timings, step, fn, *args):
+    """Run fn(*args), recording its duration in milliseconds as timings[step]."""
+    started = time.perf_counter()
     try:
-        # Initialize RAG
-        rag = FAISSRAG()
-        rag_context = ""
-        try:
-            # Load PDF if index doesn't exist
-            if not os.path.exists(os.path.join(settings.BASE_DIR, 'faiss_index.index')):
-                rag.load_pdf_and_embed('data/08.031.17-Agile-Playbook-2.1-v12-One-Per-Student.pdf')
-            # Query RAG for Agile context
-            results = rag.search("how to extract features in Agile methodology", k=3)
-            rag_context = "\n".join([doc for doc, _ in results])
-        except Exception as e:
-            print(f"Warning: Failed to load RAG context: {e}")
-            rag_context = "Use Agile methodology best practices."
+        return fn(*args)
+    finally:
+        timings[step] = round((time.perf_counter() - started) * 1000, 1)
 
-        # Generate analysis with LLM
-        analysis = generate_idea_analysis(idea, team_metadata, rag_context)
+def get_playbook_context():
+    """Retrieve Agile playbook context for the idea prompt, or the fallback text."""
+    global _playbook_context
+    try:
+        # Shared per-process RAG; the model and index are loaded only once
+        rag = get_rag()
+        if rag.index is None:
+            # Build the playbook index in the background; don't make this request wait
+            rebuild_index_async()
+            return PLAYBOOK_FALLBACK_CONTEXT
+        version, context = _playbook_context
+        if version is not None and version == rag.index_version:
+            return context
+        # Query RAG for Agile context
+        results = rag.search(PLAYBOOK_QUERY, k=3)
+        context = "\n".join([doc for doc, _ in results])
+        _playbook_context = (rag.index_version, context)
+        return context
+    except Exception as e:
+        print(f"Warning: Failed to load RAG context: {e}")
+        return PLAYBOOK_FALLBACK_CONTEXT
+
+def write_use_case_map(project_id, analysis):
+    """Generate the Markdown use-case map of an analysis and save it to outputs/."""
+    output_dir = os.path.join(settings.BASE_DIR, 'outputs')
+    os.makedirs(output_dir, exist_ok=True)
+    md_content = generate_use_case_map(analysis.get('features', []), analysis.get('personas', []))
+    md_path = os.path.join(output_dir, f'use_case_map_{project_id}.md')
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write(md_content)
+    print(f"Saved use-case map to {md_path}")
+
+def save_idea_outputs(project_id, analysis, input_hash=None, wait=True, timings=None):
+    """Save the analysis to MongoDB and write its Markdown use-case map, concurrently.
 
-        # Save to MongoDB
-        save_agent_output(project_id, "idea_agent", analysis)
+    The save is always waited for, so a failed save fails the call. With
+    wait=False the use-case map keeps being written after this returns, and
+    a failure there is logged. Step durations are recorded in timings
+    (milliseconds).
+    """
+    timings = {} if timings is None else timings
+    executor = _get_side_effect_executor()
+    use_case_map = executor.submit(_timed, timings, "use_case_map", write_use_case_map, project_id, analysis)
+    _timed(timings, "persist", save_agent_output, project_id, "idea_agent", analysis, input_hash)
+    if wait:
+        use_case_map.result()
+        return timings
 
-        # Generate and save Markdown use-case map
-        output_dir = os.path.join(settings.BASE_DIR, 'outputs')
-        os.makedirs(output_dir, exist_ok=True)
-        md_content = generate_use_case_map(analysis.get('features', []), analysis.get('personas', []))
-        md_path = os.path.join(output_dir, f'use_case_map_{project_id}.md')
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(md_content)
-        print(f"Saved use-case map to {md_path}")
+    def report(future):
+        if future.exception() is not None:
+            print(f"Warning: idea_agent use_case_map failed for {project_id}: {future.exception()}")
+        else:
+            print(f"idea_agent use_case_map for {project_id} took {timings.get('use_case_map')} ms")
 
+    use_case_map.add_done_callback(report)
+    return timings
+
+def process_idea(project_id, idea, team_metadata, use_cache=True, input_hash=None, wait=None):
+    """Process a product idea and generate structured output.
+
+    Returns once the analysis has been generated, validated and saved. The
+    Markdown use-case map is written concurrently with the save on the
+    side-effect executor, and finishes in the background unless wait
+    (default: not IDEA_ASYNC_SIDE_EFFECTS) is set.
+    """
+    if wait is None:
+        wait = not getattr(settings, "IDEA_ASYNC_SIDE_EFFECTS", True)
+    timings = {}
+    started = time.perf_counter()
+    try:
+        rag_context = _timed(timings, "rag", get_playbook_context)
+
+        # Generate analysis with LLM
+        analysis = _timed(timings, "llm", generate_idea_analysis, idea, team_metadata, rag_context, None, use_cache)
+
+        _timed(timings, "side_effects", save_idea_outputs, project_id, analysis, input_hash, wait, timings)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"process_idea timings for {project_id} (ms): {timings}")
         return analysis
     except Exception as e:
-        raise ValueError(f"Failed to process idea: {e}")
\ No newline at end of file
+        raise ValueError(f"Failed to process idea: {e}")
+
+def stream_process_idea(project_id, idea, team_metadata, use_cache=True):
+    """Streaming variant of process_idea.
+
+    Yields ("token", text) events while Gemini generates, then saves the
+    parsed analysis and yields it as a final ("result", analysis) event.
+    """
+    try:
+        rag_context = get_playbook_context()
+        for event, data in stream_idea_analysis(idea, team_metadata, rag_context, use_cache=use_cache):
+            if event == "result":
+                save_idea_outputs(project_id, data, wait=not getattr(settings, "IDEA_ASYNC_SIDE_EFFECTS", True))
+            yield event, data
+    except Exception as e:
+        raise ValueError(f"Failed to process idea: {e}")
@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+from django.conf import settings
+from agentic_app.agents.idea_agent import process_idea
+from agentic_app.agents.epic_agent import generate_epics_and_stories
+from agentic_app.agents.team_matcher_agent import match_team_and_allocate
+from agentic_app.utils.jobs import JobWorker, job_is_live
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Job handlers take the payload queued by the endpoint and the job ID, and
+# return the body the synchronous endpoint would have returned (without
+# "status"). A handler abandoned after a timeout or cancellation keeps running:
+# the team matcher checks the job before reserving developers for good, while
+# the idea and epic agents may still save their output.
+
+def process_idea_job(payload, job_id):
+    # Also finish the use-case map before the job is reported done
+    analysis = process_idea(payload["project_id"], payload["idea"], payload["team_metadata"],
+                            use_cache=payload.get("use_cache", True), wait=True)
+    return {"analysis": analysis}
+
+def generate_epics_job(payload, job_id):
+    epics_stories = generate_epics_and_stories(payload["features"], payload["project_id"],
+                                               use_cache=payload.get("use_cache", True))
+    return {"epics_stories": epics_stories}
+
+def team_matcher_job(payload, job_id):
+    allocations = match_team_and_allocate(payload["project_id"], use_cache=payload.get("use_cache", True),
+                                          incremental=payload.get("incremental", True),
+                                          still_wanted=lambda: job_is_live(job_id))
+    return {"project_id": payload["project_id"], "allocations": allocations.get("allocations", []),
+            "unassigned": allocations.get("unassigned", [])}
+
+JOB_HANDLERS = {
+    "process_idea": process_idea_job,
+    "generate_epics": generate_epics_job,
+    "team_matcher": team_matcher_job,
+}
+
+# Worker threads inside the web process, started on first use. Threads do not
+# survive a fork, so each worker process starts its own.
+_local_worker = None
+_local_worker_pid = None
+_local_worker_lock = threading.Lock()
+
+def start_local_workers():
+    """Start JOBS_LOCAL_WORKERS job threads in this process, once; returns the worker or None."""
+    global _local_worker, _local_worker_pid
+    concurrency = getattr(settings, "JOBS_LOCAL_WORKERS", 2)
+    if concurrency <= 0:
+        return None
+    with _local_worker_lock:
+        if _local_worker is None or _local_worker_pid != os.getpid():
+            _local_worker = JobWorker(JOB_HANDLERS, concurrency=concurrency).start()
+            _local_worker_pid = os.getpid()
+        return _local_worker
+
+def get_local_worker_stats():
+    worker = _local_worker if _local_worker_pid == os.getpid() else None
+    return worker.stats() if worker is not None else None
@@ -1,47 +1,200 @@
 import os
 import sys
-import json
 from django.conf import settings
 # Updated import
-from agentic_app.utils.db import get_user_stories, get_mongo_client, save_agent_output
-from agentic_app.utils.llm import initialize_gemini
+from agentic_app.utils.db import get_db, save_agent_output, get_latest_agent_output
+from agentic_app.utils.llm import generate_json
+from agentic_app.utils.team_prompt import build_team_matcher_prompt, build_reasons_prompts, story_hash
+from agentic_app.utils.allocator import allocate
+from agentic_app.utils.skill_index import get_developer_index
+from agentic_app.utils.embedding_cache import semantic_affinity
+from agentic_app.utils.reservations import reserve_developers, release_developers, free_developer_ids
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if BASE_DIR not in sys.path:
     sys.path.append(BASE_DIR)
 
 
-def fetch_available_developers():
-    """Fetch developers who are free (task_allocated=False) from MongoDB."""
-    client = get_mongo_client()
-    db = client[settings.MONGO_DB_NAME]
-    collection = db["developers"]
-    devs = list(collection.find({"task_allocated": False}, {"_id": 0}))
-    client.close()
-    return devs
-
-
-def update_developer_allocation(developer_names):
-    """Mark developers as allocated in MongoDB."""
-    client = get_mongo_client()
-    db = client[settings.MONGO_DB_NAME]
-    collection = db["developers"]
-    collection.update_many(
-        {"name": {"$in": developer_names}},
-        {"$set": {"task_allocated": True}}
+def fetch_available_developers(skills=(), min_bandwidth=0.0):
+    """Fetch developers who are free (task_allocated=False) and match skills and bandwidth.
+
+    The in-memory skill index narrows the candidates; whether each is free is
+    read from MongoDB, since other processes reserve and release developers.
+    """
+    index = get_developer_index()
+    candidates = index.query(skills, min_bandwidth, available_only=False)
+    free = set(free_developer_ids([d["developer_id"] for d in candidates]))
+    index.set_allocated([d["developer_id"] for d in candidates if d["developer_id"] not in free])
+    index.set_allocated(free, allocated=False)
+    return [d for d in candidates if d["developer_id"] in free]
+
+
+def assign_stories(stories, developers, use_cache=True):
+    """Choose a developer for each story, with the solver or the LLM (TEAM_MATCHER_MODE)."""
+    if getattr(settings, "TEAM_MATCHER_MODE", "solver") == "llm":
+        allocations = allocate_with_llm(stories, developers, use_cache)
+        ids = {d.get("name"): d.get("developer_id") for d in developers}
+        for allocation in allocations["allocations"]:
+            allocation["developer_id"] = ids.get(allocation.get("assigned_to"))
+        return allocations
+    return allocate(
+        stories, developers,
+        stories_per_developer=getattr(settings, "TEAM_MATCHER_STORIES_PER_DEVELOPER", 1),
+        affinity=story_developer_affinity(stories, developers),
     )
-    client.close()
 
 
-def match_team_and_allocate(project_id):
-    """Allocate stories to developers based on skills, bandwidth, and performance."""
+def allocate_and_reserve(project_id, stories, developers, use_cache=True, held=()):
+    """Assign stories and atomically reserve the chosen developers for project_id.
+
+    Developers that a concurrent matcher reserved first are dropped from the
+    pool, and their stories re-assigned, up to TEAM_MATCHER_RESERVATION_RETRIES
+    times. Returns {"allocations": [...], "unassigned": [...]}; every developer
+    in allocations is reserved for this project. held are developers the
+    project already holds; they stay held if allocation fails.
+    """
+    index = get_developer_index()
+    result = {"allocations": [], "unassigned": []}
+    pending, pool = stories, developers
+    retries = getattr(settings, "TEAM_MATCHER_RESERVATION_RETRIES", 3)
+    claimed = []
+    try:
+        for attempt in range(retries + 1):
+            batch = assign_stories(pending, pool, use_cache)
+            result["unassigned"].extend(batch.get("unassigned", []))
+            chosen = [a["developer_id"] for a in batch["allocations"] if a.get("developer_id")]
+            reserved, conflicts = reserve_developers(chosen, project_id)
+            claimed.extend(reserved)
+            index.set_allocated(reserved + conflicts)
+
+            lost = set(conflicts)
+            retry_titles = set()
+            for allocation in batch["allocations"]:
+                if not allocation.get("developer_id"):
+                    # The LLM named someone outside the pool
+                    result["unassigned"].append(allocation.get("story_title", ""))
+                elif allocation["developer_id"] in lost:
+                    retry_titles.add(allocation.get("story_title", ""))
+                else:
+                    result["allocations"].append(allocation)
+
+            if not retry_titles:
+                break
+            taken = lost | set(reserved)
+            pool = [d for d in pool if d.get("developer_id") not in taken]
+            pending = [s for s in pending if s.get("title", "") in retry_titles]
+            if not pool or attempt == retries:
+                result["unassigned"].extend(sorted(retry_titles))
+                break
+            print(f"Team matcher: {len(lost)} developers reserved by another project, re-assigning {len(pending)} stories")
+    except Exception:
+        # A later round failed: free what earlier rounds reserved
+        claimed = [d for d in claimed if d not in set(held)]
+        if claimed:
+            release_developers(claimed, project_id)
+            index.set_allocated(claimed, allocated=False)
+        raise
+    return result
+
+
+def allocate_with_llm(stories, developers, use_cache=True):
+    """Let the LLM choose assignments, in token-budgeted batches.
+
+    Each prompt carries as many stories as fit, each with a shortlist of
+    candidate developers. Developers assigned in one batch are not offered
+    to the next.
+    """
+    allocations = {"allocations": []}
+    remaining = stories
+    while remaining and developers:
+        prompt, tokens, count = build_team_matcher_prompt(remaining, developers)
+        print(f"Team matcher prompt: {count} stories, {tokens} tokens")
+
+        # Invoke (or serve from the response cache) and parse JSON
+        batch = generate_json(prompt, use_cache=use_cache)
+        allocations["allocations"].extend(batch.get("allocations", []))
+
+        assigned = {a.get("assigned_to") for a in batch.get("allocations", [])}
+        developers = [d for d in developers if d.get("name") not in assigned]
+        remaining = remaining[count:]
+    return allocations
+
+
+def add_llm_reasons(allocations, developers, use_cache=True):
+    """Replace the template reasons of solver allocations with LLM-written ones.
+
+    Failures are logged and leave the template reasons in place.
+    """
+    reasons = {}
+    try:
+        for prompt, tokens in build_reasons_prompts(allocations, developers):
+            print(f"Team matcher reasons prompt: {tokens} tokens")
+            output = generate_json(prompt, use_cache=use_cache)
+            for item in output.get("reasons", []):
+                if item.get("story_title") and item.get("reason"):
+                    reasons[item["story_title"]] = item["reason"]
+    except Exception as e:
+        print(f"Warning: Failed to generate allocation reasons: {e}")
+    for allocation in allocations:
+        allocation["reason"] = reasons.get(allocation["story_title"], allocation["reason"])
+
+
+def story_developer_affinity(stories, developers):
+    """Embedding affinity of stories and developers' skills, or None if disabled or unavailable."""
+    if not getattr(settings, "TEAM_MATCHER_SEMANTIC", True):
+        return None
+    try:
+        return semantic_affinity(stories, developers)
+    except Exception as e:
+        print(f"Warning: Semantic skill matching unavailable, using literal matches: {e}")
+        return None
+
+
+def diff_allocation(stories, previous):
+    """Split stories against the previous allocation of the project.
+
+    Returns (kept, pending, released): previous allocations whose story is
+    unchanged, the stories that need assigning (added, changed, or left
+    unassigned last time), and the developer IDs of allocations whose story
+    was removed or changed.
+    """
+    current = {}
+    for story in stories:
+        current.setdefault(story.get("title", ""), story_hash(story))
+    kept, released = [], []
+    kept_titles = set()
+    for allocation in (previous or {}).get("allocations", []):
+        title = allocation.get("story_title", "")
+        unchanged = (
+            allocation.get("story_hash") is not None
+            and current.get(title) == allocation["story_hash"]
+            and title not in kept_titles
+        )
+        if unchanged and allocation.get("developer_id"):
+            kept.append(allocation)
+            kept_titles.add(title)
+        elif allocation.get("developer_id"):
+            released.append(allocation["developer_id"])
+    pending = [story for story in stories if story.get("title", "") not in kept_titles]
+    return kept, pending, released
+
+
+def match_team_and_allocate(project_id, use_cache=True, incremental=True, input_hash=None, still_wanted=None):
+    """Allocate stories to developers based on skills, bandwidth, and performance.
+
+    With incremental, only stories that were added, changed, or left
+    unassigned since the project's last allocation are assigned; developers
+    of removed or changed stories are offered to the new assignment along
+    with free developers, and those not re-assigned are released once the
+    new allocation is saved. Unchanged assignments are kept as they are.
+    If still_wanted is given and returns False just before the save (e.g. the
+    job running this timed out), the new reservations are released and
+    nothing is saved.
+    """
     try:
         # 1. Get user stories from the new collection
-        client = get_mongo_client()
-        db = client[settings.MONGO_DB_NAME]
-        collection = db['project_epics_stories']
+        collection = get_db()['project_epics_stories']
         epics_stories_doc = collection.find_one({"project_id": project_id})
-        client.close()
         
         if not epics_stories_doc:
             raise ValueError(f"No epics and stories found for project_id {project_id}")
@@ -51,63 +204,66 @@ def match_team_and_allocate(project_id):
         if not stories:
             raise ValueError("No user stories found for allocation")
 
-        # 2. Get available developers
-        developers = fetch_available_developers()
-        if not developers:
-            raise ValueError("No available developers for allocation")
-
-        # 3. Prepare AI prompt
-        model = initialize_gemini()
-        prompt = f"""
-You are an AI allocation assistant. 
-Given the list of user stories and developer profiles, allocate each story to the best-suited developer.
-Criteria:
-- Match skills in story with developer skills.
-- Prefer developers with higher past_performance_score.
-- Only assign developers who are available.
-- Ensure fair distribution based on bandwidth.
-
-Output ONLY in this JSON format:
-{{
-  "allocations": [
-    {{
-      "story_title": "",
-      "assigned_to": "",
-      "reason": ""
-    }}
-  ]
-}}
-
-User Stories:
-{json.dumps(stories, indent=2)}
-
-Developers:
-{json.dumps(developers, indent=2)}
-"""
-
-        response = model.invoke(prompt)
-        content = response.content.strip()
-
-        # FIX: Clean potential markdown formatting from the LLM response
-        if content.startswith("```json"):
-            content = content[len("```json"):].strip()
-        if content.endswith("```"):
-            content = content[:-len("```")].strip()
-
-        # 4. Parse JSON
+        # 2. Diff against the last allocation; developers of removed or changed
+        # stories (all of them for a full re-allocation) are released later
+        previous = get_latest_agent_output(project_id, "team_matcher_agent")
+        kept, pending, released = diff_allocation(stories, previous)
+        if not incremental:
+            released += [a["developer_id"] for a in kept]
+            kept, pending = [], stories
+        if previous is not None and not pending and not released:
+            print(f"Team matcher: no story changes for {project_id}, keeping the previous allocation")
+            return previous
+        kept_ids = {a["developer_id"] for a in kept}
+        # They stay reserved for this project until the new allocation is saved
+        held = [d for d in dict.fromkeys(released) if d not in kept_ids]
+        print(f"Team matcher: {len(kept)} allocations kept, {len(pending)} stories to assign, "
+              f"{len(held)} developers up for re-assignment")
+
+        # 3. Allocate and reserve developers atomically, so concurrent
+        # matchers for other projects cannot double-book them
+        allocations = {"allocations": [], "unassigned": []}
+        developers = []
+        if pending:
+            held_set = set(held)
+            developers = fetch_available_developers() + [
+                d for d in get_developer_index().query(available_only=False) if d["developer_id"] in held_set]
+            if not developers:
+                raise ValueError("No available developers for allocation")
+            allocations = allocate_and_reserve(project_id, pending, developers, use_cache, held=held)
+        hashes = {story.get("title", ""): story_hash(story) for story in pending}
+        for allocation in allocations["allocations"]:
+            allocation["story_hash"] = hashes.get(allocation.get("story_title", ""))
+        reserved = [a["developer_id"] for a in allocations["allocations"]]
+
         try:
-            allocations = json.loads(content)
-        except json.JSONDecodeError:
-            raise ValueError(f"Failed to parse LLM output as JSON: {content}")
+            # 4. Optionally let the LLM phrase the reasons; the assignment itself is fixed
+            if allocations["allocations"] and getattr(settings, "TEAM_MATCHER_MODE", "solver") != "llm" \
+                    and getattr(settings, "TEAM_MATCHER_LLM_REASONS", False):
+                add_llm_reasons(allocations["allocations"], developers, use_cache)
 
-        # 5. Save output in MongoDB
-        save_agent_output(project_id, "team_matcher_agent", allocations)
+            # 5. Save the merged allocation in MongoDB
+            if still_wanted is not None and not still_wanted():
+                raise ValueError("Allocation abandoned before saving")
+            allocations["allocations"] = kept + allocations["allocations"]
+            save_agent_output(project_id, "team_matcher_agent", allocations, input_hash)
+        except Exception:
+            # Don't leave developers reserved for an allocation that was never
+            # recorded; developers the previous allocation holds stay held
+            fresh = [d for d in reserved if d not in set(held)]
+            release_developers(fresh, project_id)
+            get_developer_index().set_allocated(fresh, allocated=False)
+            raise
 
-        # 6. Update developer allocation status
-        assigned_names = [a["assigned_to"] for a in allocations.get("allocations", [])]
-        update_developer_allocation(assigned_names)
+        # 6. Release developers of removed or changed stories that were not re-assigned
+        assigned = {a["developer_id"] for a in allocations["allocations"]}
+        freed = [d for d in held if d not in assigned]
+        if freed:
+            release_developers(freed, project_id)
+            get_developer_index().set_allocated(freed, allocated=False)
+            print(f"Team matcher: released {len(freed)} developers")
 
         return allocations
 
     except Exception as e:
-        raise ValueError(f"Failed in Team Matcher Agent: {e}")
\ No newline at end of file
+        raise ValueError(f"Failed in Team Matcher Agent: {e}")
@@ -1,8 +1,15 @@
+import json
+import time
+import hashlib
 from langgraph.graph import StateGraph
 from typing import TypedDict
+from django.conf import settings
 from agentic_app.agents.idea_agent import process_idea
 from agentic_app.agents.epic_agent import generate_epics_and_stories
-from agentic_app.agents.team_matcher_agent import match_team_and_allocate  # NEW
+from agentic_app.agents.team_matcher_agent import match_team_and_allocate, fetch_available_developers  # NEW
+from agentic_app.utils.checkpointer import MongoCheckpointSaver
+from agentic_app.utils.db import get_user_stories, get_latest_agent_output, get_memoized_output, save_user_stories
+from agentic_app.utils.skill_index import get_developer_index
 
 class AgentState(TypedDict):
     project_id: str
@@ -11,32 +18,82 @@ class AgentState(TypedDict):
     agent1_output: dict
     agent2_output: dict
     agent3_output: dict  # NEW
+    force: bool
+    publish_stories: bool
 
-def agent1_node(state: AgentState) -> AgentState:
+# Nodes return only the keys they produce, so each checkpoint step persists
+# just that node's output. Each node also hashes its inputs and, unless the
+# run is forced, returns the agent's stored output when it was generated from
+# the same inputs.
+
+def input_hash(agent_name, *inputs):
+    """Stable SHA-256 of an agent's name and inputs."""
+    payload = json.dumps([agent_name, *inputs], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def memoized(state, agent_name, digest):
+    """The stored output for digest, or None if the run is forced or inputs changed."""
+    if state.get("force"):
+        return None
+    output = get_memoized_output(state["project_id"], agent_name, digest)
+    if output is not None:
+        print(f"{agent_name}: inputs unchanged for {state['project_id']}, reusing stored output")
+    return output
+
+def agent1_node(state: AgentState) -> dict:
     """Run Agent 1: Idea Understanding & Feature Extraction."""
     try:
-        analysis = process_idea(state["project_id"], state["idea"], state["team_metadata"])
-        state["agent1_output"] = analysis
-        return state
+        digest = input_hash("idea_agent", state["idea"], state["team_metadata"])
+        analysis = memoized(state, "idea_agent", digest)
+        if analysis is None:
+            # The save is always awaited, so the next run's memoization can read it back
+            analysis = process_idea(state["project_id"], state["idea"], state["team_metadata"],
+                                    use_cache=not state.get("force"), input_hash=digest)
+        return {"agent1_output": analysis}
     except Exception as e:
         raise ValueError(f"Agent 1 failed: {e}")
 
-def agent2_node(state: AgentState) -> AgentState:
+def agent2_node(state: AgentState) -> dict:
     """Run Agent 2: Epic and Story Generator."""
     try:
         features = state["agent1_output"].get("features", [])
-        epics_stories = generate_epics_and_stories(features, state["project_id"])
-        state["agent2_output"] = epics_stories
-        return state
+        digest = input_hash("epic_agent", features)
+        epics_stories = memoized(state, "epic_agent", digest)
+        if epics_stories is None:
+            epics_stories = generate_epics_and_stories(features, state["project_id"],
+                                                       use_cache=not state.get("force"), input_hash=digest)
+        if state.get("publish_stories"):
+            # Unattended runs (bulk backfills) have no manager approving the stories
+            save_user_stories(state["project_id"], epics_stories)
+        return {"agent2_output": epics_stories}
     except Exception as e:
         raise ValueError(f"Agent 2 failed: {e}")
 
-def agent3_node(state: AgentState) -> AgentState:
+def allocation_input_hash(project_id):
+    """Hash of the stories and the developer pool the team matcher would allocate from.
+
+    The pool is the free developers plus those holding this project's current
+    allocation, so it does not change just because the last run reserved them.
+    """
+    stories = get_user_stories(project_id)["output"]["user_stories"]
+    previous = get_latest_agent_output(project_id, "team_matcher_agent") or {}
+    held = {a["developer_id"] for a in previous.get("allocations", []) if a.get("developer_id")}
+    developers = get_developer_index().query(available_only=False)
+    free = {d["developer_id"] for d in fetch_available_developers()}
+    pool = {d["developer_id"]: [d["skills"], d["bandwidth"], d["past_performance_score"]]
+            for d in developers if d["developer_id"] in free or d["developer_id"] in held}
+    mode = getattr(settings, "TEAM_MATCHER_MODE", "solver")
+    return input_hash("team_matcher_agent", mode, stories, pool)
+
+def agent3_node(state: AgentState) -> dict:
     """Run Agent 3: Team Skill Matcher & Story Allocator."""
     try:
-        allocations = match_team_and_allocate(state["project_id"])
-        state["agent3_output"] = allocations
-        return state
+        digest = allocation_input_hash(state["project_id"])
+        allocations = memoized(state, "team_matcher_agent", digest)
+        if allocations is None:
+            allocations = match_team_and_allocate(state["project_id"], use_cache=not state.get("force"),
+                                                  incremental=not state.get("force"), input_hash=digest)
+        return {"agent3_output": allocations}
     except Exception as e:
         raise ValueError(f"Agent 3 failed: {e}")
 
@@ -53,5 +110,49 @@ workflow.add_edge("agent2", "agent3")  # NEW
 workflow.set_entry_point("agent1")
 workflow.set_finish_point("agent3")  # Now finishes at Agent 3
 
-# Compile the workflow
-app = workflow.compile()
+# Compile the workflow with MongoDB checkpoints, one thread per project. The
+# saver resolves its collections on use, so importing this opens no connection.
+checkpointer = MongoCheckpointSaver()
+app = workflow.compile(checkpointer=checkpointer)
+
+def workflow_config(project_id):
+    return {"configurable": {"thread_id": str(project_id)}}
+
+def run_workflow(project_id, idea, team_metadata, resume=True, force=False, on_stage=None,
+                 publish_stories=False):
+    """Run the pipeline for a project, resuming an interrupted run if there is one.
+
+    If the project's last run stopped at a failed node and was started with
+    the same idea and team_metadata, that run continues by re-running the
+    failed node, reusing the checkpointed outputs of the nodes that
+    succeeded. Otherwise (or with resume=False) a fresh run starts and the
+    project's old checkpoints are discarded. With force=True every node
+    regenerates its output, bypassing stored outputs and the LLM cache.
+    on_stage(node, seconds) is called as each node completes. With
+    publish_stories=True the generated epics and stories are saved as the
+    project's approved set, so Agent 3 can allocate them without the
+    save-epics step.
+    """
+    config = workflow_config(project_id)
+    snapshot = app.get_state(config)
+    pending = snapshot.next
+    same_inputs = (snapshot.values.get("idea") == idea
+                   and snapshot.values.get("team_metadata") == team_metadata)
+    if resume and pending and not force and same_inputs:
+        print(f"Resuming workflow for {project_id} at {', '.join(pending)}")
+        state = None
+    else:
+        if resume and pending and not same_inputs:
+            print(f"Inputs changed for {project_id}, starting a fresh workflow run")
+        checkpointer.delete_thread(str(project_id))
+        state = {"project_id": project_id, "idea": idea, "team_metadata": team_metadata, "force": force,
+                 "publish_stories": publish_stories}
+
+    started = time.perf_counter()
+    for update in app.stream(state, config, stream_mode="updates"):
+        finished = time.perf_counter()
+        if on_stage:
+            for node in update:
+                on_stage(node, finished - started)
+        started = finished
+    return app.get_state(config).values
@@ -0,0 +1,68 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pymongo import MongoClient
+from agentic_app.utils.db import get_db, ping_mongo
+
+
+def _percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "Compare per-request MongoDB latency: a new MongoClient per call vs the shared pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Number of simulated requests")
+        parser.add_argument("--calls-per-request", type=int, default=4,
+                            help="DB helper calls per request (submit-idea + team-matcher do ~4)")
+        parser.add_argument("--project-id", default="bench-project", help="project_id used for lookups")
+
+    def _unpooled_call(self, project_id):
+        # Old behaviour: connect, run one query, close
+        client = MongoClient(settings.MONGO_URI)
+        try:
+            client[settings.MONGO_DB_NAME]["project_analysis"].find_one({"project_id": project_id})
+        finally:
+            client.close()
+
+    def _pooled_call(self, project_id):
+        get_db()["project_analysis"].find_one({"project_id": project_id})
+
+    def _run(self, call, requests, calls_per_request, project_id):
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            for _ in range(calls_per_request):
+                call(project_id)
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    def _report(self, label, samples):
+        self.stdout.write(
+            f"{label:<10} mean {statistics.mean(samples):8.2f} ms  "
+            f"p50 {_percentile(samples, 50):8.2f} ms  p95 {_percentile(samples, 95):8.2f} ms"
+        )
+
+    def handle(self, *args, **options):
+        health = ping_mongo()
+        if not health["ok"]:
+            self.stderr.write(f"MongoDB is not reachable: {health['error']}")
+            return
+
+        requests = options["requests"]
+        calls = options["calls_per_request"]
+        project_id = options["project_id"]
+        self.stdout.write(f"{requests} requests x {calls} DB calls each against {settings.MONGO_DB_NAME}")
+
+        before = self._run(self._unpooled_call, requests, calls, project_id)
+        after = self._run(self._pooled_call, requests, calls, project_id)
+
+        self._report("unpooled", before)
+        self._report("pooled", after)
+        speedup = statistics.mean(before) / max(statistics.mean(after), 1e-9)
+        self.stdout.write(f"Mean per-request speedup: {speedup:.1f}x")
@@ -0,0 +1,68 @@
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from agentic_app.utils.chunk_store import ChunkStore, store_exists
+from agentic_app.utils.encoders import ENCODER_BACKENDS, get_encoder
+from agentic_app.utils.rag import published_store_dir
+
+
+class Command(BaseCommand):
+    help = "Benchmark RAG encoder backends: sentences/sec and similarity gap against the torch fp32 model."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", nargs="*", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+        parser.add_argument("--sentences", type=int, default=256, help="Number of stored chunks to encode")
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--model", default="all-MiniLM-L6-v2")
+
+    def _sample(self, count):
+        # The chunks of the published index version, as FAISSRAG loads them
+        docs_path = os.path.join(published_store_dir(), "documents")
+        if not store_exists(docs_path):
+            raise CommandError("No chunk store found; ingest documents first.")
+        store = ChunkStore(docs_path)
+        try:
+            return [store[i] for i in range(min(count, len(store)))]
+        finally:
+            store.close()
+
+    def _encode_all(self, encoder, texts, batch_size):
+        encoder.encode(texts[:batch_size])  # warm-up
+        started = time.perf_counter()
+        parts = [encoder.encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        elapsed = time.perf_counter() - started
+        return np.vstack(parts), elapsed
+
+    def handle(self, *args, **options):
+        texts = self._sample(options["sentences"])
+        batch_size = options["batch_size"]
+        self.stdout.write(f"Encoding {len(texts)} chunks in batches of {batch_size}")
+
+        # The torch fp32 model is the reference every backend is compared with
+        reference = None
+        backends = options["backends"]
+        if "torch" in backends:
+            backends = ["torch"] + [b for b in backends if b != "torch"]
+        else:
+            reference, _ = self._encode_all(get_encoder("torch", options["model"]), texts, batch_size)
+
+        for backend in backends:
+            started = time.perf_counter()
+            try:
+                encoder = get_encoder(backend, options["model"])
+            except ValueError as e:
+                self.stderr.write(f"{backend:<11} skipped: {e}")
+                continue
+            load_seconds = time.perf_counter() - started
+            embeddings, elapsed = self._encode_all(encoder, texts, batch_size)
+            if reference is None:
+                reference = embeddings
+
+            a = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+            b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+            cosine = (a * b).sum(axis=1)
+            self.stdout.write(
+                f"{backend:<11} load {load_seconds:6.2f}s  {len(texts) / elapsed:8.1f} sentences/s  "
+                f"cosine vs torch: mean {cosine.mean():.4f} min {cosine.min():.4f}"
+            )
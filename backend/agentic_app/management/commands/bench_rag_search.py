@@ -0,0 +1,47 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from agentic_app.utils.rag import get_rag
+
+DEFAULT_QUERIES = [
+    "how to extract features in Agile methodology",
+    "how to identify and mitigate project risks",
+    "how to define user personas and their needs",
+    "how to estimate user stories and plan sprints",
+]
+
+
+class Command(BaseCommand):
+    help = "Compare one batched search_many call against N sequential search calls."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", nargs="*", default=DEFAULT_QUERIES, help="Queries to search for")
+        parser.add_argument("-k", type=int, default=3, help="Results per query")
+        parser.add_argument("--rounds", type=int, default=50, help="Timed repetitions of each variant")
+
+    def _time(self, rag, fn, rounds):
+        fn()  # warm-up
+        samples = []
+        for _ in range(rounds):
+            # Time the encoder and index, not QueryCache hits from the previous round
+            rag.query_cache.invalidate()
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    def handle(self, *args, **options):
+        rag = get_rag()
+        if rag.index is None:
+            raise CommandError("The RAG index is empty; run ingest_documents first.")
+        queries, k, rounds = options["queries"], options["k"], options["rounds"]
+
+        sequential = self._time(rag, lambda: [rag.search(q, k=k) for q in queries], rounds)
+        batched = self._time(rag, lambda: rag.search_many(queries, k=k, dedupe=False), rounds)
+        deduped = self._time(rag, lambda: rag.search_many(queries, k=k), rounds)
+
+        self.stdout.write(f"{len(queries)} queries, k={k}, {rounds} rounds, index of {rag.index.ntotal} vectors")
+        for label, samples in (("sequential", sequential), ("search_many", batched), ("+dedupe", deduped)):
+            self.stdout.write(f"{label:<12} median {statistics.median(samples):8.2f} ms  "
+                              f"mean {statistics.mean(samples):8.2f} ms")
+        self.stdout.write(f"Speedup: {statistics.median(sequential) / max(statistics.median(batched), 1e-9):.1f}x")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from agentic_app.utils.rag import get_rag
+
+
+class Command(BaseCommand):
+    help = "Incrementally ingest every PDF in a directory into the RAG index, skipping known content."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", nargs="?", default="data",
+                            help="Directory of PDFs, relative to the backend directory")
+        parser.add_argument("--workers", type=int, default=None, help="Page extraction processes")
+        parser.add_argument("--batch-size", type=int, default=None, help="Chunks per embedding batch")
+        parser.add_argument("--force", action="store_true",
+                            help="Re-read documents even if their file hash is unchanged")
+
+    def handle(self, *args, **options):
+        rag = get_rag()
+
+        def progress(state):
+            self.stdout.write(
+                f"\r{state['documents_done']}/{state['documents_total'] - state['documents_unchanged']} documents, "
+                f"{state['chunks']} new chunks, {state['skipped']} duplicates skipped",
+                ending="",
+            )
+
+        try:
+            summary = rag.ingest_directory(
+                options["directory"],
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                progress=progress,
+                force=options["force"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['chunks']} chunks added, {summary['skipped']} duplicates skipped, "
+            f"{summary['documents_unchanged']} unchanged documents, {len(rag.documents)} chunks indexed"
+        ))
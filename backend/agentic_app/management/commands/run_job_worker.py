@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from agentic_app.agents.jobs import JOB_HANDLERS
+from agentic_app.utils.db import ping_mongo
+from agentic_app.utils.jobs import JobWorker, queue_metrics
+
+
+class Command(BaseCommand):
+    help = ("Run queued agent jobs (submitted with Prefer: respond-async) from the jobs collection. "
+            "Needs only MongoDB; run as many as you like.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Jobs run at once")
+        parser.add_argument("--kinds", default=",".join(JOB_HANDLERS),
+                            help=f"Comma-separated job kinds to take (default: {','.join(JOB_HANDLERS)})")
+        parser.add_argument("--poll-interval", type=float, help="Seconds between polls of an empty queue")
+        parser.add_argument("--report-every", type=float, default=60, help="Seconds between status lines (0 = never)")
+
+    def handle(self, *args, **options):
+        kinds = [k.strip() for k in options["kinds"].split(",") if k.strip()]
+        unknown = [k for k in kinds if k not in JOB_HANDLERS]
+        if unknown:
+            raise CommandError(f"Unknown job kinds: {', '.join(unknown)}")
+        health = ping_mongo()
+        if not health["ok"]:
+            raise CommandError(f"MongoDB is not reachable: {health['error']}")
+
+        worker = JobWorker({k: JOB_HANDLERS[k] for k in kinds}, concurrency=options["concurrency"],
+                           poll_interval=options["poll_interval"]).start()
+        self.stdout.write(f"Worker {worker.name} taking {', '.join(kinds)} jobs, {worker.concurrency} at a time")
+        try:
+            while True:
+                time.sleep(options["report_every"] or 3600)
+                if options["report_every"]:
+                    stats, queue = worker.stats(), queue_metrics()
+                    self.stdout.write(
+                        f"queue depth {queue['depth']}, running {queue['running']}, "
+                        f"oldest queued {queue['oldest_queued_seconds']:.0f} s | this worker: "
+                        f"{stats['busy']} busy, {stats['succeeded']} succeeded, {stats['failed']} failed, "
+                        f"{stats['timed_out']} timed out, {stats['cancelled']} cancelled"
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping; waiting for running jobs to finish (Ctrl-C again to quit now)")
+            worker.stop(wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped: {worker.stats()}"))
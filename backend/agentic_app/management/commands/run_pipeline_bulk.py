@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import UpdateOne
+from agentic_app.agents.workflow import run_workflow
+from agentic_app.utils.db import get_db
+from agentic_app.utils.llm import DEFAULT_MODEL, get_llm_metrics, set_rate_limit
+
+STAGES = ("agent1", "agent2", "agent3", "total")
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ("Run the idea -> epics -> team matcher workflow for every idea in a JSONL file "
+            "({project_id, idea, team_metadata} per line), resumable from a cursor file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file of ideas")
+        parser.add_argument("--concurrency", type=int, default=4, help="Workflows in flight at once")
+        parser.add_argument("--rpm", type=float, default=settings.LLM_RATE_LIMIT_PER_MINUTE,
+                            help="LLM calls per minute for the model (0 = unlimited)")
+        parser.add_argument("--burst", type=int, default=settings.LLM_RATE_LIMIT_BURST)
+        parser.add_argument("--cursor", help="Cursor file (default: <path>.cursor)")
+        parser.add_argument("--restart", action="store_true", help="Ignore the cursor and start from line 1")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Re-run only the lines recorded as failed for this file; the cursor is left as is")
+        parser.add_argument("--write-batch", type=int, default=100, help="Results per bulk write")
+        parser.add_argument("--collection", default="bulk_pipeline_results")
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many ideas (0 = all)")
+        parser.add_argument("--force", action="store_true", help="Regenerate every stage, bypassing stored outputs")
+        parser.add_argument("--no-publish-stories", action="store_true",
+                            help="Do not save generated stories as approved (Agent 3 then needs them saved already)")
+
+    def _read_cursor(self, path):
+        try:
+            with open(path) as f:
+                return int(json.load(f).get("next_line", 1))
+        except FileNotFoundError:
+            return 1
+        except (ValueError, AttributeError) as e:
+            raise CommandError(f"Unreadable cursor file {path}: {e}")
+
+    def _write_cursor(self, path, next_line):
+        # Replace atomically so an interrupted write never leaves a torn cursor
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"next_line": next_line, "updated_at": datetime.now().isoformat()}, f)
+        os.replace(tmp, path)
+
+    def _default_project_id(self, source, line_no):
+        # Unique per file and line, so separate backfills never share checkpoints,
+        # stored outputs or allocations
+        return "bulk-" + hashlib.sha256(f"{source}:{line_no}".encode("utf-8")).hexdigest()[:16]
+
+    def _run_one(self, source, line_no, line, force, publish_stories):
+        timings = {}
+        record = {"source": source, "line": line_no}
+        started = time.perf_counter()
+        try:
+            payload = json.loads(line)
+            if not payload.get("idea"):
+                raise ValueError("missing idea")
+            record["project_id"] = str(payload.get("project_id") or self._default_project_id(source, line_no))
+            final = run_workflow(
+                record["project_id"], payload["idea"], payload.get("team_metadata") or {},
+                force=force, publish_stories=publish_stories,
+                on_stage=lambda node, seconds: timings.__setitem__(node, seconds),
+            )
+            record["status"] = "completed"
+            record["features"] = len((final.get("agent1_output") or {}).get("features", []))
+            record["user_stories"] = len((final.get("agent2_output") or {}).get("user_stories", []))
+            record["allocations"] = len((final.get("agent3_output") or {}).get("allocations", []))
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+        timings["total"] = time.perf_counter() - started
+        record["timings"] = timings
+        record["finished_at"] = datetime.now()
+        return record
+
+    def _flush(self, collection, buffer):
+        if not buffer:
+            return
+        collection.bulk_write([
+            UpdateOne({"source": r["source"], "line": r["line"]}, {"$set": r}, upsert=True) for r in buffer
+        ], ordered=False)
+        buffer.clear()
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        source = os.path.abspath(path)
+        cursor_path = options["cursor"] or f"{path}.cursor"
+        retry_failed = options["retry_failed"]
+        start_line = 1 if options["restart"] or retry_failed else self._read_cursor(cursor_path)
+        if options["rpm"]:
+            set_rate_limit(DEFAULT_MODEL, options["rpm"], options["burst"])
+        collection = get_db()[options["collection"]]
+        collection.create_index([("source", 1), ("line", 1)], unique=True)
+        failed_lines = None
+        if retry_failed:
+            failed_lines = {doc["line"] for doc in collection.find({"source": source, "status": "failed"}, {"line": 1})}
+            self.stdout.write(f"Retrying {len(failed_lines)} failed lines")
+        concurrency = max(1, options["concurrency"])
+        publish_stories = not options["no_publish_stories"]
+        self.stdout.write(f"Running {path} from line {start_line}, {concurrency} concurrent, "
+                          f"rate limit {options['rpm'] or 'none'} calls/min")
+
+        samples = defaultdict(list)
+        failures = []
+        buffer = []
+        done = set()
+        next_line = start_line
+        submitted = 0
+        started = time.perf_counter()
+
+        def advance_cursor():
+            # The cursor only passes lines whose results are written, in order.
+            # Failed lines count as done; --retry-failed re-runs them.
+            nonlocal next_line
+            if retry_failed:
+                return
+            while next_line in done:
+                done.remove(next_line)
+                next_line += 1
+            self._write_cursor(cursor_path, next_line)
+
+        def collect(futures):
+            for future in futures:
+                record = future.result()
+                buffer.append(record)
+                done.add(record["line"])
+                if record["status"] == "completed":
+                    for stage, seconds in record["timings"].items():
+                        samples[stage].append(seconds)
+                else:
+                    failures.append(record)
+            if len(buffer) >= options["write_batch"]:
+                self._flush(collection, buffer)
+                advance_cursor()
+
+        in_flight = set()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool, open(path, encoding="utf-8") as f:
+                for line_no, line in enumerate(f, start=1):
+                    if line_no < start_line or (failed_lines is not None and line_no not in failed_lines):
+                        continue
+                    if not line.strip():
+                        done.add(line_no)
+                        continue
+                    if options["limit"] and submitted >= options["limit"]:
+                        break
+                    # Bounded window: never read far ahead of the workers
+                    if len(in_flight) >= concurrency * 2:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    in_flight.add(pool.submit(self._run_one, source, line_no, line,
+                                              options["force"], publish_stories))
+                    submitted += 1
+                while in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+        finally:
+            self._flush(collection, buffer)
+            advance_cursor()
+
+        elapsed = time.perf_counter() - started
+        completed = len(samples["total"])
+        self.stdout.write(f"{completed + len(failures)} ideas in {elapsed:.1f} s "
+                          f"({(completed + len(failures)) / max(elapsed, 1e-9) * 60:.1f}/min), "
+                          f"{completed} completed, {len(failures)} failed"
+                          + ("" if retry_failed else f"; cursor at line {next_line}"))
+        self.stdout.write(f"{'stage':<8}{'p50 s':>10}{'p95 s':>10}{'n':>8}")
+        for stage in STAGES:
+            values = samples[stage]
+            self.stdout.write(f"{stage:<8}{_percentile(values, 50):10.2f}{_percentile(values, 95):10.2f}{len(values):8d}")
+        for model, values in get_llm_metrics()["models"].items():
+            self.stdout.write(f"{model}: {values['calls']} calls, rate limit wait {values['rate_limit_wait_seconds']:.1f} s, "
+                              f"queue wait {values['queue_wait_seconds']:.1f} s")
+        for record in failures[:10]:
+            self.stdout.write(self.style.WARNING(f"line {record['line']}: {record.get('error')}"))
+        if len(failures) > 10:
+            self.stdout.write(f"... and {len(failures) - 10} more (status 'failed' in {options['collection']})")
@@ -0,0 +1,166 @@
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from pymongo import MongoClient
+from agentic_app.agents.team_matcher_agent import match_team_and_allocate
+from agentic_app.utils.db import close_mongo_client, get_db, get_latest_agent_output
+from agentic_app.utils.skill_index import get_developer_index
+
+
+class Command(BaseCommand):
+    help = ("Run many concurrent team matcher allocations for the same developers against a MongoDB "
+            "and check that no developer is double-booked or left reserved. Uses a scratch database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mongo-uri", default=settings.MONGO_URI, help="MongoDB to run against (a local mongod)")
+        parser.add_argument("--db", default="allocation_stress", help="Scratch database, dropped before and after")
+        parser.add_argument("--developers", type=int, default=200)
+        parser.add_argument("--projects", type=int, default=100)
+        parser.add_argument("--per-project", type=int, default=5, help="Stories (one developer each) per project")
+        parser.add_argument("--workers", type=int, default=32, help="Concurrent allocations")
+        parser.add_argument("--retries", type=int, default=3, help="Re-assignment rounds after a reservation conflict")
+        parser.add_argument("--legacy", action="store_true",
+                            help="Also run the old read-then-update_many flow for comparison")
+        parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def _seed(self, db, developers, projects, per_project, seed):
+        rng = random.Random(seed)
+        db["developers"].drop()
+        db["developers"].insert_many([{
+            "name": f"dev-{i}",
+            "skills": ["python"],
+            "past_performance_score": round(rng.random(), 3),
+            "bandwidth": 0.8,
+            "task_allocated": False,
+        } for i in range(developers)])
+        db["project_epics_stories"].drop()
+        db["agent_outputs"].drop()
+        db["project_epics_stories"].insert_many([{
+            "project_id": project_id,
+            "epics_stories": {"user_stories": [
+                {"title": f"{project_id} python story {j}", "gherkin": "Given a python service"}
+                for j in range(per_project)
+            ]},
+        } for project_id in self._project_ids(projects)])
+
+    def _project_ids(self, projects):
+        return [f"stress-project-{i}" for i in range(projects)]
+
+    def _edit_stories(self, db, project_ids):
+        # Change one story, drop one and add one, so the next run keeps some
+        # developers, releases some and reserves new ones
+        for project_id in project_ids:
+            doc = db["project_epics_stories"].find_one({"project_id": project_id})
+            stories = doc["epics_stories"]["user_stories"]
+            if stories:
+                stories[0] = dict(stories[0], gherkin="Given a changed python requirement")
+                stories = stories[:-1] if len(stories) > 1 else stories
+            stories.append({"title": f"{project_id} python story added", "gherkin": "Given a python service"})
+            db["project_epics_stories"].update_one({"project_id": project_id},
+                                                   {"$set": {"epics_stories.user_stories": stories}})
+
+    def _match(self, project_id):
+        try:
+            match_team_and_allocate(project_id, use_cache=False)
+            return project_id, None
+        except ValueError as e:
+            return project_id, str(e)
+
+    def _run(self, label, fn, project_ids, workers):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fn, project_ids))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<8} {elapsed * 1000:9.1f} ms  {len(project_ids) / max(elapsed, 1e-9):8.1f} projects/s")
+        return results
+
+    def _check(self, db, project_ids):
+        """Return (double_booked, left_behind, unreserved) counts for the saved allocations."""
+        owners = defaultdict(set)
+        for project_id in project_ids:
+            for allocation in (get_latest_agent_output(project_id, "team_matcher_agent") or {}).get("allocations", []):
+                owners[allocation["developer_id"]].add(project_id)
+        double_booked = sum(1 for holders in owners.values() if len(holders) > 1)
+        reserved = {str(doc["_id"]): doc.get("allocated_project")
+                    for doc in db["developers"].find({"task_allocated": True}, {"_id": 1, "allocated_project": 1})}
+        # Reserved for a project whose saved allocation does not use the developer
+        left_behind = sum(1 for d, project_id in reserved.items() if project_id not in owners.get(d, ()))
+        # Used by a saved allocation but not reserved for that project
+        unreserved = sum(1 for d, holders in owners.items() if reserved.get(d) not in holders)
+        return double_booked, left_behind, unreserved
+
+    def _legacy_project(self, collection, project_id, wanted):
+        # Everyone prefers the best performers, which maximizes contention
+        docs = collection.find({"task_allocated": {"$ne": True}}, {"_id": 1, "past_performance_score": 1})
+        chosen = [str(d["_id"]) for d in sorted(docs, key=lambda d: -d["past_performance_score"])][:wanted]
+        collection.update_many({"_id": {"$in": [ObjectId(d) for d in chosen]}}, {"$set": {"task_allocated": True}})
+        return project_id, chosen
+
+    def _run_legacy(self, collection, project_ids, wanted, workers):
+        results = self._run("legacy", lambda p: self._legacy_project(collection, p, wanted), project_ids, workers)
+        owners = defaultdict(list)
+        for project_id, claimed in results:
+            for developer_id in claimed:
+                owners[developer_id].append(project_id)
+        double_booked = sum(1 for holders in owners.values() if len(holders) > 1)
+        self.stdout.write(f"legacy   double-booked: {double_booked}")
+
+    def handle(self, *args, **options):
+        client = MongoClient(options["mongo_uri"], serverSelectionTimeoutMS=3000)
+        try:
+            client.admin.command("ping")
+        except Exception as e:
+            raise CommandError(f"MongoDB is not reachable at {options['mongo_uri']}: {e}")
+        db = client[options["db"]]
+        projects, workers, wanted = options["projects"], options["workers"], options["per_project"]
+        project_ids = self._project_ids(projects)
+        self.stdout.write(f"{projects} projects x {wanted} stories from a pool of {options['developers']} developers, "
+                          f"{workers} concurrent")
+
+        # The team matcher reads and writes through get_db(); point it at the
+        # scratch database, with the solver only (no LLM or encoder calls)
+        scratch = override_settings(
+            MONGO_URI=options["mongo_uri"], MONGO_DB_NAME=options["db"], MONGO_MAX_POOL_SIZE=workers + 4,
+            TEAM_MATCHER_MODE="solver", TEAM_MATCHER_LLM_REASONS=False, TEAM_MATCHER_SEMANTIC=False,
+            TEAM_MATCHER_STORIES_PER_DEVELOPER=1, TEAM_MATCHER_RESERVATION_RETRIES=options["retries"],
+        )
+        scratch.enable()
+        close_mongo_client()
+        try:
+            if options["legacy"]:
+                self._seed(db, options["developers"], projects, wanted, options["seed"])
+                self._run_legacy(db["developers"], project_ids, wanted, workers)
+
+            self._seed(db, options["developers"], projects, wanted, options["seed"])
+            get_developer_index().load(get_db()["developers"])
+            failures = []
+            for label in ("initial", "edited"):
+                if label == "edited":
+                    self._edit_stories(db, project_ids[::2])
+                results = self._run(label, self._match, project_ids, workers)
+                failed = [(p, e) for p, e in results if e]
+                failures.extend(failed)
+                if failed and len(failed) == len(project_ids):
+                    raise CommandError(f"Every allocation failed in the {label} run: {failed[0][1]}")
+                double_booked, left_behind, unreserved = self._check(db, project_ids)
+                self.stdout.write(f"{label:<8} failed: {len(failed)}, double-booked: {double_booked}, "
+                                  f"left reserved: {left_behind}, allocated without reservation: {unreserved}")
+                if double_booked or left_behind or unreserved:
+                    raise CommandError(f"Reservation failed after the {label} run: {double_booked} double-booked, "
+                                       f"{left_behind} left reserved, {unreserved} allocated without reservation")
+            for project_id, error in failures[:5]:
+                # Expected once the pool runs out; anything else is worth a look
+                self.stdout.write(self.style.WARNING(f"{project_id}: {error}"))
+            self.stdout.write(self.style.SUCCESS("No developer was double-booked or left reserved."))
+        finally:
+            close_mongo_client()
+            scratch.disable()
+            if not options["keep"]:
+                client.drop_database(options["db"])
+            client.close()
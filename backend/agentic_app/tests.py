@@ -1,3 +1,300 @@
-from django.test import TestCase
+import json
+from unittest import mock
+import numpy as np
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from agentic_app.agents.team_matcher_agent import diff_allocation
+from agentic_app.utils.allocator import allocate, developer_capacity, solve_assignment
+from agentic_app.utils.embedding_cache import semantic_affinity
+from agentic_app.utils.jobs import job_timeout
+from agentic_app.utils.rag import FAISSRAG
+from agentic_app.utils.reservations import free_developer_ids, release_developers, reserve_developers
+from agentic_app.utils.skill_index import DeveloperIndex
+from agentic_app.utils.team_prompt import story_hash
+
+
+def developer(name, skills, performance=0.8, bandwidth=1.0):
+    return {"developer_id": name, "name": name, "skills": skills,
+            "past_performance_score": performance, "bandwidth": bandwidth}
+
+
+def story(title, gherkin=""):
+    return {"title": title, "gherkin": gherkin}
+
+
+class AllocatorTests(SimpleTestCase):
+    def test_stories_go_to_developers_with_matching_skills(self):
+        developers = [developer("alice", ["Python"]), developer("bob", ["React"])]
+        stories = [story("React dashboard"), story("Build python API")]
+        result = allocate(stories, developers)
+        assigned = {a["story_title"]: a["assigned_to"] for a in result["allocations"]}
+        self.assertEqual(assigned, {"React dashboard": "bob", "Build python API": "alice"})
+        self.assertEqual(result["unassigned"], [])
+        self.assertEqual(result["allocations"][1]["matched_skills"], ["python"])
+
+    def test_stories_beyond_capacity_are_unassigned(self):
+        developers = [developer("alice", ["python"]), developer("bob", ["python"])]
+        stories = [story(f"python task {i}") for i in range(3)]
+        result = allocate(stories, developers)
+        self.assertEqual(len(result["allocations"]), 2)
+        self.assertEqual(len(result["unassigned"]), 1)
+        self.assertEqual(len({a["assigned_to"] for a in result["allocations"]}), 2)
+
+    def test_capacity_allows_several_stories_per_developer(self):
+        developers = [developer("alice", ["python"]), developer("bob", ["react"])]
+        stories = [story("python task 1"), story("python task 2"), story("react task")]
+        result = allocate(stories, developers, capacities=[2, 1])
+        assigned = [a["assigned_to"] for a in result["allocations"]]
+        self.assertEqual(assigned, ["alice", "alice", "bob"])
+        self.assertEqual(result["unassigned"], [])
+
+    def test_developer_capacity_scales_with_bandwidth(self):
+        self.assertEqual(developer_capacity(developer("a", [], bandwidth=0.5), stories_per_developer=4), 2)
+        self.assertEqual(developer_capacity(developer("a", [], bandwidth=0.0), stories_per_developer=4), 1)
+        self.assertEqual(developer_capacity(developer("a", [], bandwidth=1.0)), 1)
+
+    def test_allocation_is_deterministic(self):
+        developers = [developer(f"dev{i}", ["python", "sql"][: i % 2 + 1], performance=0.5 + i / 20)
+                      for i in range(6)]
+        stories = [story(f"python story {i}", "Given sql data") for i in range(4)]
+        self.assertEqual(allocate(stories, developers), allocate(stories, developers))
+
+    def test_solve_assignment_maximizes_the_total_score(self):
+        # Greedy would take 0.9 first; the optimum pairs story 0 with developer 1
+        scores = np.array([[0.9, 0.8], [0.85, 0.1]], dtype=np.float32)
+        self.assertEqual(solve_assignment(scores, [1, 1]).tolist(), [1, 0])
+
+    def test_solve_assignment_without_capacity(self):
+        scores = np.ones((2, 1), dtype=np.float32)
+        self.assertEqual(solve_assignment(scores, [0]).tolist(), [-1, -1])
+        self.assertEqual(solve_assignment(np.zeros((0, 2), dtype=np.float32), [1, 1]).tolist(), [])
+
+
+class DiffAllocationTests(SimpleTestCase):
+    def allocation(self, s, developer_id):
+        return {"story_title": s["title"], "developer_id": developer_id, "story_hash": story_hash(s)}
+
+    def test_without_previous_allocation_every_story_is_pending(self):
+        stories = [story("a"), story("b")]
+        self.assertEqual(diff_allocation(stories, None), ([], stories, []))
+
+    def test_unchanged_changed_removed_and_unassigned_stories(self):
+        unchanged, changed, removed, unassigned = story("a"), story("b"), story("c"), story("d")
+        previous = {"allocations": [
+            self.allocation(unchanged, "dev1"),
+            self.allocation(changed, "dev2"),
+            self.allocation(removed, "dev3"),
+            {"story_title": "d", "developer_id": None, "story_hash": story_hash(unassigned)},
+        ]}
+        edited = story("b", "Given a new requirement")
+        kept, pending, released = diff_allocation([unchanged, edited, unassigned], previous)
+        self.assertEqual([a["developer_id"] for a in kept], ["dev1"])
+        self.assertEqual(pending, [edited, unassigned])
+        self.assertEqual(released, ["dev2", "dev3"])
+
+    def test_allocations_without_hash_are_reassigned(self):
+        s = story("a")
+        kept, pending, released = diff_allocation([s], {"allocations": [{"story_title": "a", "developer_id": "dev1"}]})
+        self.assertEqual((kept, pending, released), ([], [s], ["dev1"]))
+
+
+class DeveloperIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = DeveloperIndex()
+        self.index.upsert({"_id": "d1", "name": "alice", "skills": ["Python", "SQL"], "bandwidth": 0.8,
+                           "past_performance_score": 0.9})
+        self.index.upsert({"_id": "d2", "name": "bob", "skills": ["python"], "bandwidth": 0.3,
+                           "past_performance_score": 0.7})
+        self.index.upsert({"_id": "d3", "name": "carol", "skills": ["React"], "bandwidth": 1.0,
+                           "task_allocated": True})
+
+    def ids(self, developers):
+        return [d["developer_id"] for d in developers]
+
+    def test_query_by_normalized_skills_and_bandwidth(self):
+        self.assertEqual(self.ids(self.index.query(["  PYTHON "])), ["d1", "d2"])
+        self.assertEqual(self.ids(self.index.query(["python", "sql"])), ["d1"])
+        self.assertEqual(self.ids(self.index.query(["python"], min_bandwidth=0.5)), ["d1"])
+        self.assertEqual(self.index.query(["cobol"]), [])
+
+    def test_query_skips_allocated_developers_unless_asked(self):
+        self.assertEqual(self.ids(self.index.query(["react"])), [])
+        self.assertEqual(self.ids(self.index.query(["react"], available_only=False)), ["d3"])
+
+    def test_set_allocated(self):
+        self.index.set_allocated(["d1"])
+        self.assertEqual(self.ids(self.index.query(["python"])), ["d2"])
+        self.index.set_allocated(["d1", "d3"], allocated=False)
+        self.assertEqual(self.ids(self.index.query()), ["d1", "d2", "d3"])
+        self.index.set_allocated(["unknown"])
+        self.assertEqual(len(self.index), 3)
+
+    def test_upsert_replaces_and_remove_hides(self):
+        self.index.upsert({"_id": "d2", "name": "bob", "skills": ["Go"], "bandwidth": 0.3})
+        self.assertEqual(self.ids(self.index.query(["python"])), ["d1"])
+        self.assertEqual(self.ids(self.index.query(["go"])), ["d2"])
+        self.index.remove("d1")
+        self.assertEqual(self.ids(self.index.query(["python"])), [])
+        self.assertEqual(len(self.index), 2)
+
+
+class DeveloperCollection:
+    """In-memory stand-in for the developers collection, matching the filters reservations uses."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def _matches(self, doc, query):
+        for key, condition in query.items():
+            if key == "$or":
+                if not any(self._matches(doc, q) for q in condition):
+                    return False
+            elif isinstance(condition, dict) and "$ne" in condition:
+                if doc.get(key) == condition["$ne"]:
+                    return False
+            elif isinstance(condition, dict) and "$in" in condition:
+                if key not in doc or doc[key] not in condition["$in"]:
+                    return False
+            elif key not in doc or doc[key] != condition:
+                return False
+        return True
+
+    def _update(self, doc, update):
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+    def find_one_and_update(self, query, update, projection=None):
+        for doc in self.docs:
+            if self._matches(doc, query):
+                self._update(doc, update)
+                return {"_id": doc["_id"]}
+        return None
+
+    def update_many(self, query, update):
+        matched = [doc for doc in self.docs if self._matches(doc, query)]
+        for doc in matched:
+            self._update(doc, update)
+        return type("UpdateResult", (), {"modified_count": len(matched)})()
+
+    def find(self, query, projection=None):
+        return [doc for doc in self.docs if self._matches(doc, query)]
+
+
+class ReservationTests(SimpleTestCase):
+    def setUp(self):
+        self.ids = [ObjectId() for _ in range(3)]
+        self.collection = DeveloperCollection([
+            {"_id": self.ids[0], "name": "alice", "task_allocated": False},
+            {"_id": self.ids[1], "name": "bob"},  # never allocated: no task_allocated field
+            {"_id": self.ids[2], "name": "carol", "task_allocated": True, "allocated_project": "other"},
+        ])
+        self.str_ids = [str(i) for i in self.ids]
+
+    def test_developers_without_the_field_are_free_and_claimable(self):
+        self.assertEqual(free_developer_ids(self.str_ids, self.collection), self.str_ids[:2])
+        reserved, conflicts = reserve_developers(self.str_ids, "p1", self.collection)
+        self.assertEqual(reserved, self.str_ids[:2])
+        self.assertEqual(conflicts, self.str_ids[2:])
+        self.assertEqual(self.collection.docs[1]["allocated_project"], "p1")
+
+    def test_a_reserved_developer_goes_to_one_project(self):
+        self.assertEqual(reserve_developers(self.str_ids[1:2], "p1", self.collection), (self.str_ids[1:2], []))
+        self.assertEqual(reserve_developers(self.str_ids[1:2], "p2", self.collection), ([], self.str_ids[1:2]))
+        # The holder may claim it again
+        self.assertEqual(reserve_developers(self.str_ids[1:2], "p1", self.collection), (self.str_ids[1:2], []))
+
+    def test_release_only_frees_the_projects_own_developers(self):
+        reserve_developers(self.str_ids, "p1", self.collection)
+        self.assertEqual(release_developers(self.str_ids, "p1", self.collection), 2)
+        self.assertEqual(free_developer_ids(self.str_ids, self.collection), self.str_ids[:2])
+        self.assertEqual(self.collection.docs[2]["allocated_project"], "other")
+
+
+class SearchManyTests(SimpleTestCase):
+    def setUp(self):
+        # No index or encoder: the batch search returns canned hits per query
+        self.hits = {
+            "a": (("chunk 1", 0.1), ("chunk 2", 0.2), ("chunk 3", 0.3)),
+            "b": (("chunk 4", 0.1), ("chunk 2", 0.1), ("chunk 5", 0.4)),
+        }
+        self.searched = []
+        self.rag = FAISSRAG.__new__(FAISSRAG)
+        self.rag._search_batch = self.search_batch
+
+    def search_batch(self, queries, k, nprobe=None, ef_search=None):
+        self.searched.append(list(queries))
+        return [list(self.hits[q.strip().lower()]) for q in queries]
+
+    def test_repeated_queries_get_the_results_of_their_first_occurrence(self):
+        results = self.rag.search_many(["a", "b", " A "])
+        self.assertEqual(self.searched, [["a", "b"]])
+        self.assertEqual([len(hits) for hits in results], [2, 3, 2])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[0], [("chunk 1", 0.1), ("chunk 3", 0.3)])
+
+    def test_without_dedupe_every_query_keeps_its_hits(self):
+        results = self.rag.search_many(["a", "b", "a"], dedupe=False)
+        self.assertEqual([len(hits) for hits in results], [3, 3, 3])
+        self.assertIsNot(results[0], results[2])
+
+
+@override_settings(JOBS_DEFAULT_TIMEOUT=600, JOBS_MAX_TIMEOUT=3600)
+class JobTimeoutTests(SimpleTestCase):
+    def test_default_and_cap(self):
+        self.assertEqual(job_timeout(None), 600)
+        self.assertEqual(job_timeout("90"), 90.0)
+        self.assertEqual(job_timeout(7200), 3600)
+
+    def test_invalid_timeouts_are_rejected(self):
+        for timeout in ("soon", 0, -5, "nan", True, [30]):
+            with self.assertRaises(ValueError):
+                job_timeout(timeout)
+
+    def test_async_request_with_invalid_timeout_is_a_bad_request(self):
+        body = {"project_id": "p1", "idea": "An idea", "team_metadata": {"size": 3}, "timeout_seconds": "soon"}
+        response = self.client.post(reverse("process_idea"), json.dumps(body), content_type="application/json",
+                                    headers={"Prefer": "respond-async"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("timeout_seconds", response.json()["error"])
+
+
+class StubEncoder:
+    """Unit vectors for known texts, in place of the sentence encoder and its cache."""
+
+    vectors = {
+        "python": [1.0, 0.0],
+        "react": [0.0, 1.0],
+        "api\n": [1.0, 0.0],
+        "service\n": [0.8, 0.6],
+        "widget\n": [0.5, 0.75 ** 0.5],
+    }
+
+    def embed_texts(self, texts):
+        return np.array([self.vectors[t] for t in texts], dtype=np.float32).reshape(len(texts), 2)
+
+
+@override_settings(TEAM_MATCHER_SEMANTIC_FLOOR=0.5)
+class SemanticAffinityTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("agentic_app.utils.embedding_cache.embed_texts", StubEncoder().embed_texts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.developers = [developer("alice", ["Python"]), developer("bob", ["react"]), developer("carol", [])]
+
+    def test_cosines_at_or_below_the_floor_are_zero_and_the_rest_rescaled(self):
+        affinity = semantic_affinity([story("api"), story("service"), story("widget")], self.developers)
+        # cosines: api (1, 0), service (0.8, 0.6), widget (0.5, 0.87); carol has no skills
+        expected = [[1.0, 0.0, 0.0], [0.6, 0.2, 0.0], [0.0, 0.732, 0.0]]
+        np.testing.assert_allclose(affinity, expected, atol=1e-3)
+
+    def test_floor_argument_overrides_the_setting(self):
+        affinity = semantic_affinity([story("service")], self.developers[:2], floor=0.0)
+        np.testing.assert_allclose(affinity, [[0.8, 0.6]], atol=1e-6)
+
+    def test_developer_skills_are_averaged(self):
+        affinity = semantic_affinity([story("api")], [developer("dana", ["python", "react"])])
+        # cosine 0.707 with the mean of both skills
+        np.testing.assert_allclose(affinity, [[(2 ** -0.5 - 0.5) / 0.5]], atol=1e-5)
@@ -4,6 +4,8 @@ from agentic_app import views
 urlpatterns = [
     path('submit-idea/', views.process_idea_endpoint, name='process_idea'),
     path('epics/', views.generate_epics_endpoint, name='generate_epics'),
+    path('submit-idea/stream/', views.process_idea_stream_endpoint, name='process_idea_stream'),
+    path('epics/stream/', views.generate_epics_stream_endpoint, name='generate_epics_stream'),
     path("team-matcher/", views.team_matcher_endpoint, name="team_matcher_endpoint"),
     path("developers/", views.get_developers_endpoint, name="get_developers_endpoint"),
     path("developer/signup/", views.developer_signup, name="developer_signup"),
@@ -13,4 +15,10 @@ urlpatterns = [
     path("managers/", views.get_managers_endpoint, name="get_managers_endpoint"),
     path("save-analysis/", views.save_analysis, name="save_analysis"),
     path("save-epics-features/", views.save_epics_stories, name="save_epics_features"),
+    path("health/db/", views.db_health_endpoint, name="db_health_endpoint"),
+    path("rag/stats/", views.rag_stats_endpoint, name="rag_stats_endpoint"),
+    path("llm/metrics/", views.llm_metrics_endpoint, name="llm_metrics_endpoint"),
+    path("jobs/metrics/", views.job_metrics_endpoint, name="job_metrics_endpoint"),
+    path("jobs/<str:job_id>/", views.job_status_endpoint, name="job_status_endpoint"),
+    path("jobs/<str:job_id>/cancel/", views.cancel_job_endpoint, name="cancel_job_endpoint"),
 ]
\ No newline at end of file
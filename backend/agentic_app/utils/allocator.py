@@ -0,0 +1,145 @@
+import os
+import sys
+import re
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from agentic_app.utils.team_prompt import normalize_skill, story_text
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Deterministic story-to-developer allocation. Every story x developer pair is
+# scored at once as a NumPy matrix, and the capacity-constrained assignment is
+# solved with the Hungarian method (SciPy's linear_sum_assignment) by giving
+# each developer one column per story they can take.
+
+SCORE_WEIGHTS = {"skill": 0.6, "performance": 0.25, "bandwidth": 0.15}
+WORD_RE = re.compile(r"[a-z0-9+#.]+")
+
+def skill_vocabulary(developers):
+    """Sorted normalized skills of developers, and a skill -> column map."""
+    skills = sorted({normalize_skill(s) for d in developers for s in d.get("skills", []) if normalize_skill(s)})
+    return skills, {skill: j for j, skill in enumerate(skills)}
+
+def developer_skill_matrix(developers, vocabulary):
+    """Boolean developers x skills matrix."""
+    matrix = np.zeros((len(developers), len(vocabulary)), dtype=bool)
+    for i, developer in enumerate(developers):
+        for skill in developer.get("skills", []):
+            j = vocabulary.get(normalize_skill(skill))
+            if j is not None:
+                matrix[i, j] = True
+    return matrix
+
+def story_skill_matrix(stories, skills):
+    """Boolean stories x skills matrix: skill j is required by story i if all
+    its words occur in the story's title or Gherkin text."""
+    postings = {}
+    for i, story in enumerate(stories):
+        for word in set(WORD_RE.findall(story_text(story).lower())):
+            postings.setdefault(word, []).append(i)
+    matrix = np.zeros((len(stories), len(skills)), dtype=bool)
+    for j, skill in enumerate(skills):
+        terms = WORD_RE.findall(skill)
+        if not terms or any(term not in postings for term in terms):
+            continue
+        rows = set(postings[terms[0]])
+        for term in terms[1:]:
+            rows.intersection_update(postings[term])
+        matrix[list(rows), j] = True
+    return matrix
+
+def developer_features(developers):
+    """Performance scaled to [0, 1] by the pool's best, and bandwidth clipped to [0, 1]."""
+    performance = np.array([float(d.get("past_performance_score") or 0.0) for d in developers], dtype=np.float32)
+    bandwidth = np.array([float(d.get("bandwidth") or 0.0) for d in developers], dtype=np.float32)
+    top = performance.max() if len(performance) else 0.0
+    if top > 0:
+        performance = performance / top
+    return np.clip(performance, 0.0, 1.0), np.clip(bandwidth, 0.0, 1.0)
+
+def score_matrix(stories, developers, weights=None, affinity=None):
+    """Score every story x developer pair; returns (scores, story_skills, dev_skills, skills).
+
+    The skill term is the fraction of a story's required skills the developer
+    has. affinity, an optional precomputed stories x developers matrix in
+    [0, 1] (such as rescaled embedding similarity, where 0 means unrelated),
+    raises it where it is higher, so literal matches still count fully.
+    """
+    weights = weights or SCORE_WEIGHTS
+    skills, vocabulary = skill_vocabulary(developers)
+    dev_skills = developer_skill_matrix(developers, vocabulary)
+    story_skills = story_skill_matrix(stories, skills)
+    overlap = story_skills.astype(np.float32) @ dev_skills.T.astype(np.float32)
+    required = story_skills.sum(axis=1, keepdims=True).astype(np.float32)
+    coverage = overlap / np.maximum(required, 1.0)
+    if affinity is not None:
+        coverage = np.maximum(coverage, affinity)
+    performance, bandwidth = developer_features(developers)
+    scores = (
+        weights["skill"] * coverage
+        + weights["performance"] * performance[None, :]
+        + weights["bandwidth"] * bandwidth[None, :]
+    )
+    return scores.astype(np.float32), story_skills, dev_skills, skills
+
+def developer_capacity(developer, stories_per_developer=1):
+    """Number of stories a developer can take: stories_per_developer scaled by bandwidth, at least one."""
+    bandwidth = float(developer.get("bandwidth") or 0.0)
+    return max(1, int(round(bandwidth * stories_per_developer)))
+
+def solve_assignment(scores, capacities):
+    """Maximize the total score with each story assigned at most once and
+    developer j at most capacities[j] times.
+
+    Returns an array with the developer index of each story, or -1 if the
+    developers' total capacity ran out.
+    """
+    capacities = np.asarray(capacities, dtype=np.int64)
+    columns = np.repeat(np.arange(scores.shape[1]), capacities)
+    assigned = np.full(scores.shape[0], -1, dtype=np.int64)
+    if not len(columns) or not scores.shape[0]:
+        return assigned
+    rows, cols = linear_sum_assignment(scores[:, columns], maximize=True)
+    assigned[rows] = columns[cols]
+    return assigned
+
+def template_reason(matched_skills, developer):
+    if matched_skills:
+        skills = ", ".join(matched_skills)
+        reason = f"Has the required skills ({skills})"
+    else:
+        reason = "No exact skill match; best available by performance and bandwidth"
+    return (f"{reason}; past performance {float(developer.get('past_performance_score') or 0.0):.2f}, "
+            f"bandwidth {float(developer.get('bandwidth') or 0.0):.2f}.")
+
+def allocate(stories, developers, capacities=None, stories_per_developer=1, weights=None, affinity=None):
+    """Allocate stories to developers deterministically.
+
+    Returns {"allocations": [...], "unassigned": [...]}, each allocation holding
+    story_title, assigned_to, score, matched_skills and a template reason.
+    """
+    if capacities is None:
+        capacities = [developer_capacity(d, stories_per_developer) for d in developers]
+    scores, story_skills, dev_skills, skills = score_matrix(stories, developers, weights, affinity)
+    assigned = solve_assignment(scores, capacities)
+
+    allocations, unassigned = [], []
+    for i, story in enumerate(stories):
+        j = int(assigned[i])
+        if j < 0:
+            unassigned.append(story.get("title", ""))
+            continue
+        developer = developers[j]
+        matched = [skills[s] for s in np.flatnonzero(story_skills[i] & dev_skills[j])]
+        allocations.append({
+            "story_title": story.get("title", ""),
+            "assigned_to": developer.get("name", ""),
+            "developer_id": developer.get("developer_id"),
+            "score": round(float(scores[i, j]), 4),
+            "matched_skills": matched,
+            "reason": template_reason(matched, developer),
+        })
+    return {"allocations": allocations, "unassigned": unassigned}
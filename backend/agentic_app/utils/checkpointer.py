@@ -0,0 +1,191 @@
+import os
+import sys
+from bson.binary import Binary
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from agentic_app.utils.db import get_db
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer storing workflow checkpoints in MongoDB.
+
+    Follows the layout of LangGraph's in-memory saver: a checkpoint document
+    holds only channel versions, and each channel value is stored once per
+    version in the blobs collection, so a node output is persisted when it is
+    produced rather than copied into every later checkpoint. Values are
+    serialized with the saver's serde (msgpack by default). Pending writes of
+    a step (including a failed node's error) go to the writes collection.
+    Only the synchronous API is implemented; the workflow runs in request and
+    worker threads.
+    """
+
+    def __init__(self, db=None, prefix="workflow", serde=None):
+        super().__init__(serde=serde)
+        self._db = db
+        self.prefix = prefix
+        self._indexes_ready = False
+
+    # Collections are looked up per call so a saver created at import time
+    # uses the current process's client, not one inherited across a fork
+    def _collection(self, suffix):
+        db = get_db() if self._db is None else self._db
+        return db[f"{self.prefix}_{suffix}"]
+
+    @property
+    def checkpoints(self):
+        return self._collection("checkpoints")
+
+    @property
+    def blobs(self):
+        return self._collection("checkpoint_blobs")
+
+    @property
+    def writes(self):
+        return self._collection("checkpoint_writes")
+
+    def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        self.checkpoints.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)], unique=True)
+        self.blobs.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("channel", ASCENDING), ("version", ASCENDING)],
+            unique=True)
+        self.writes.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", ASCENDING),
+             ("task_id", ASCENDING), ("idx", ASCENDING)], unique=True)
+        self._indexes_ready = True
+
+    def _dumps(self, value):
+        type_, data = self.serde.dumps_typed(value)
+        return {"type": type_, "value": Binary(data)}
+
+    def _loads(self, doc):
+        return self.serde.loads_typed((doc["type"], bytes(doc["value"])))
+
+    def _load_channel_values(self, thread_id, checkpoint_ns, versions):
+        if not versions:
+            return {}
+        docs = self.blobs.find({
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "$or": [{"channel": channel, "version": str(version)} for channel, version in versions.items()],
+        })
+        return {doc["channel"]: self._loads(doc) for doc in docs if doc["type"] != "empty"}
+
+    def _to_tuple(self, doc):
+        thread_id, checkpoint_ns = doc["thread_id"], doc["checkpoint_ns"]
+        checkpoint = self._loads(doc["checkpoint"])
+        checkpoint["channel_values"] = self._load_channel_values(
+            thread_id, checkpoint_ns, checkpoint.get("channel_versions", {}))
+        writes = self.writes.find(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": doc["checkpoint_id"]},
+            sort=[("task_id", ASCENDING), ("idx", ASCENDING)],
+        )
+        parent_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": doc["checkpoint_id"]}},
+            checkpoint=checkpoint,
+            metadata=self._loads(doc["metadata"]),
+            parent_config=({"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None),
+            pending_writes=[(w["task_id"], w["channel"], self._loads(w)) for w in writes],
+        )
+
+    def get_tuple(self, config):
+        self._ensure_indexes()
+        query = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+        }
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query["checkpoint_id"] = checkpoint_id
+        doc = self.checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        return self._to_tuple(doc) if doc else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        self._ensure_indexes()
+        query = {}
+        if config:
+            query["thread_id"] = config["configurable"]["thread_id"]
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query["checkpoint_ns"] = config["configurable"]["checkpoint_ns"]
+            if get_checkpoint_id(config):
+                query["checkpoint_id"] = get_checkpoint_id(config)
+        if before and get_checkpoint_id(before):
+            query.setdefault("checkpoint_id", {})
+            if isinstance(query["checkpoint_id"], dict):
+                query["checkpoint_id"]["$lt"] = get_checkpoint_id(before)
+        for doc in self.checkpoints.find(query, sort=[("checkpoint_id", DESCENDING)]):
+            if limit is not None and limit <= 0:
+                break
+            # Metadata is stored serialized, so it is filtered after loading
+            if filter:
+                metadata = self._loads(doc["metadata"])
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._to_tuple(doc)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self._ensure_indexes()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values", {})
+
+        # Store only the channels that changed in this step
+        blob_ops = []
+        for channel, version in new_versions.items():
+            blob = self._dumps(values[channel]) if channel in values else {"type": "empty", "value": Binary(b"")}
+            key = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel, "version": str(version)}
+            blob_ops.append(UpdateOne(key, {"$set": blob}, upsert=True))
+        if blob_ops:
+            self.blobs.bulk_write(blob_ops, ordered=False)
+
+        self.checkpoints.update_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]},
+            {"$set": {
+                "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                "checkpoint": self._dumps(checkpoint),
+                "metadata": self._dumps(get_checkpoint_metadata(config, metadata)),
+            }},
+            upsert=True,
+        )
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self._ensure_indexes()
+        base = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+            "checkpoint_id": config["configurable"]["checkpoint_id"],
+            "task_id": task_id,
+        }
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            doc = dict(self._dumps(value), channel=channel, task_path=task_path)
+            # Regular writes are idempotent per index; special ones (errors, interrupts) are replaced
+            operator = "$set" if idx < 0 else "$setOnInsert"
+            operations.append(UpdateOne(dict(base, idx=idx), {operator: doc}, upsert=True))
+        if operations:
+            self.writes.bulk_write(operations, ordered=False)
+
+    def delete_thread(self, thread_id):
+        for collection in (self.checkpoints, self.blobs, self.writes):
+            collection.delete_many({"thread_id": thread_id})
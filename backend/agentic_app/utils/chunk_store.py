@@ -0,0 +1,232 @@
+import os
+import sys
+import mmap
+import array
+import pickle
+import shutil
+import numpy as np
+import xxhash
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# On-disk layout of a chunk store at <path>:
+#   <path>.chunks   all chunk texts, UTF-8 encoded, back to back
+#   <path>.offsets  MAGIC, uint64 chunk count n, then n + 1 uint64 byte offsets
+#                   into .chunks (chunk i is blob[offsets[i]:offsets[i + 1]])
+#   <path>.ids      n int64 chunk IDs, the FAISS IDs of the chunks (optional;
+#                   stores written before IDs existed use the chunk position)
+# All integers are little-endian. The files are opened with mmap, so worker
+# processes share the pages through the OS page cache and nothing is unpickled.
+MAGIC = b'CHNKIDX1'
+HEADER_SIZE = len(MAGIC) + 8
+OFFSET_DTYPE = np.dtype('<u8')
+ID_DTYPE = np.dtype('<i8')
+
+def blob_path_for(path):
+    return path + '.chunks'
+
+def offsets_path_for(path):
+    return path + '.offsets'
+
+def ids_path_for(path):
+    return path + '.ids'
+
+def chunk_id(text):
+    """Stable content-hash ID of a chunk, a non-negative int64 usable as a FAISS ID."""
+    return xxhash.xxh3_64_intdigest(text.encode('utf-8')) & 0x7FFFFFFFFFFFFFFF
+
+def store_exists(path):
+    """Return True if both files of the chunk store at path exist."""
+    return os.path.exists(blob_path_for(path)) and os.path.exists(offsets_path_for(path))
+
+class ChunkStore:
+    """Read-only, memory-mapped sequence of chunk texts."""
+
+    def __init__(self, path):
+        self.path = path
+        self._blob_file = None
+        self._blob = None
+        self._offsets = np.zeros(1, dtype=OFFSET_DTYPE)
+        self._ids = None
+        self._id_lookup = None
+        self._open()
+
+    def _open(self):
+        try:
+            with open(offsets_path_for(self.path), 'rb') as f:
+                header = f.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a chunk store offsets file: {offsets_path_for(self.path)}")
+            count = int(np.frombuffer(header[len(MAGIC):], dtype=OFFSET_DTYPE)[0])
+            self._offsets = np.memmap(offsets_path_for(self.path), dtype=OFFSET_DTYPE, mode='r',
+                                      offset=HEADER_SIZE, shape=(count + 1,))
+            # mmap cannot map an empty file, and an empty store needs no blob
+            if count and int(self._offsets[-1]):
+                self._blob_file = open(blob_path_for(self.path), 'rb')
+                self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if count and os.path.exists(ids_path_for(self.path)):
+                self._ids = np.memmap(ids_path_for(self.path), dtype=ID_DTYPE, mode='r', shape=(count,))
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(f"chunk index {i} out of range for store of {n} chunks")
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].decode('utf-8') if end > start else ''
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def has_ids(self):
+        """True if the store records chunk IDs, False for legacy position-addressed stores."""
+        return self._ids is not None
+
+    @property
+    def ids(self):
+        """Chunk IDs in store order; positions for legacy stores."""
+        if self._ids is None:
+            return np.arange(len(self), dtype=ID_DTYPE)
+        return self._ids
+
+    def get_by_id(self, cid):
+        """Return the text of the chunk with the given ID, or None if it is not stored."""
+        if self._ids is None:
+            return self[cid] if 0 <= cid < len(self) else None
+        if self._id_lookup is None:
+            order = np.argsort(self._ids, kind='stable')
+            self._id_lookup = (np.asarray(self._ids)[order], order)
+        sorted_ids, order = self._id_lookup
+        pos = int(np.searchsorted(sorted_ids, cid))
+        if pos < len(sorted_ids) and sorted_ids[pos] == cid:
+            return self[int(order[pos])]
+        return None
+
+    def close(self):
+        """Release the memory maps. Safe to call more than once."""
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+        if self._blob_file is not None:
+            self._blob_file.close()
+            self._blob_file = None
+        self._offsets = np.zeros(1, dtype=OFFSET_DTYPE)
+        self._ids = None
+        self._id_lookup = None
+
+class ChunkStoreWriter:
+    """Write chunks to a chunk store and publish it atomically on close().
+
+    Texts are streamed to a temporary blob file as they arrive; only the offset
+    and ID tables are kept in memory (16 bytes per chunk). With base, the store
+    at base (which may be path itself) is copied first and new chunks are added
+    after it; legacy stores without IDs take theirs from existing_ids.
+    """
+
+    def __init__(self, path, base=None, existing_ids=None):
+        self.path = path
+        self._tmp_blob = blob_path_for(path) + '.tmp'
+        self._tmp_offsets = offsets_path_for(path) + '.tmp'
+        self._tmp_ids = ids_path_for(path) + '.tmp'
+        self._offsets = array.array('Q', [0])
+        self._ids = array.array('q')
+        if base is not None and store_exists(base):
+            existing = ChunkStore(base)
+            try:
+                self._offsets = array.array('Q', np.asarray(existing._offsets, dtype=np.uint64).tobytes())
+                ids = existing.ids if existing.has_ids or existing_ids is None else existing_ids
+                self._ids = array.array('q', np.asarray(ids, dtype=np.int64).tobytes())
+            finally:
+                existing.close()
+            shutil.copyfile(blob_path_for(base), self._tmp_blob)
+            self._blob = open(self._tmp_blob, 'ab')
+        else:
+            self._blob = open(self._tmp_blob, 'wb')
+        self._closed = False
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def append(self, text, cid=None):
+        """Append one chunk and return its ID (its content hash unless given)."""
+        data = text.encode('utf-8')
+        self._blob.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._ids.append(chunk_id(text) if cid is None else cid)
+        return self._ids[-1]
+
+    def extend(self, texts, ids=None):
+        for i, text in enumerate(texts):
+            self.append(text, None if ids is None else int(ids[i]))
+
+    def close(self):
+        """Flush the store files and atomically move them into place."""
+        if self._closed:
+            return
+        self._closed = True
+        self._blob.close()
+        offsets = np.frombuffer(self._offsets, dtype=np.uint64).astype(OFFSET_DTYPE, copy=False)
+        with open(self._tmp_offsets, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.array([len(offsets) - 1], dtype=OFFSET_DTYPE).tobytes())
+            f.write(offsets.tobytes())
+        with open(self._tmp_ids, 'wb') as f:
+            f.write(np.frombuffer(self._ids, dtype=np.int64).astype(ID_DTYPE, copy=False).tobytes())
+        # IDs first: a reader that sees the new offsets must also see matching IDs
+        os.replace(self._tmp_ids, ids_path_for(self.path))
+        os.replace(self._tmp_blob, blob_path_for(self.path))
+        os.replace(self._tmp_offsets, offsets_path_for(self.path))
+
+    def abort(self):
+        """Discard everything written so far."""
+        if self._closed:
+            return
+        self._closed = True
+        self._blob.close()
+        for tmp in (self._tmp_blob, self._tmp_offsets, self._tmp_ids):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_chunk_store(path, texts):
+    """Write texts as a chunk store at path."""
+    with ChunkStoreWriter(path) as writer:
+        writer.extend(texts)
+
+def convert_pickle(pickle_path, path):
+    """One-off migration of a legacy documents.pkl list into a chunk store."""
+    try:
+        with open(pickle_path, 'rb') as f:
+            documents = pickle.load(f)
+        write_chunk_store(path, documents)
+        return len(documents)
+    except Exception as e:
+        raise ValueError(f"Failed to convert {pickle_path} to a chunk store: {e}")
+
+if __name__ == "__main__":
+    # Convert a legacy pickle: python chunk_store.py documents.pkl documents
+    if len(sys.argv) != 3:
+        print("Usage: python chunk_store.py <documents.pkl> <store path>")
+        sys.exit(1)
+    count = convert_pickle(sys.argv[1], sys.argv[2])
+    print(f"Converted {count} chunks into {sys.argv[2]}")
@@ -1,5 +1,7 @@
 import os
 import sys
+import threading
+import time
 from django.conf import settings
 import django
 from pymongo import MongoClient
@@ -19,60 +21,151 @@ if __name__ == "__main__":
         print(f"Failed to configure Django settings: {e}")
         sys.exit(1)
 
+# Process-wide pooled client. MongoClient is thread-safe and keeps its own
+# connection pool, so one instance per process serves every request.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _client_options():
+    """Pool size and timeout options for the shared client, taken from settings."""
+    return {
+        "maxPoolSize": getattr(settings, "MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": getattr(settings, "MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": getattr(settings, "MONGO_MAX_IDLE_TIME_MS", 300000),
+        "serverSelectionTimeoutMS": getattr(settings, "MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": getattr(settings, "MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": getattr(settings, "MONGO_SOCKET_TIMEOUT_MS", 30000),
+    }
+
+def _reset_client_after_fork():
+    """Drop the inherited client in a forked child; MongoClient is not fork-safe."""
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_client_after_fork)
+
 def get_mongo_client():
-    """Initialize MongoDB client."""
-    try:
-        client = MongoClient(settings.MONGO_URI)
+    """Return the shared, pooled MongoDB client for this process."""
+    global _client, _client_pid
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
         return client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            try:
+                # connect=False defers the first connection until use, so a client
+                # created in a gunicorn master before fork is never shared with children
+                _client = MongoClient(settings.MONGO_URI, connect=False, **_client_options())
+                _client_pid = pid
+            except Exception as e:
+                raise ValueError(f"Failed to connect to MongoDB: {e}")
+        return _client
+
+def get_db():
+    """Return the application database from the shared client."""
+    return get_mongo_client()[settings.MONGO_DB_NAME]
+
+def close_mongo_client():
+    """Close the shared client, e.g. on worker shutdown. The next call reconnects."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def ping_mongo():
+    """Health check: ping the server and report round-trip time and pool settings."""
+    try:
+        started = time.perf_counter()
+        get_mongo_client().admin.command("ping")
+        return {
+            "ok": True,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "pool": _client_options(),
+            "pid": os.getpid(),
+        }
     except Exception as e:
-        raise ValueError(f"Failed to connect to MongoDB: {e}")
+        return {"ok": False, "error": str(e), "pid": os.getpid()}
 
 def get_project_data(project_id):
     """Retrieve project data from MongoDB."""
     try:
-        client = get_mongo_client()
-        db = client[settings.MONGO_DB_NAME]
-        collection = db['project_analysis']  # Updated collection name
+        collection = get_db()['project_analysis']  # Updated collection name
         data = collection.find_one({"project_id": project_id})
-        client.close()
         return data
     except Exception as e:
         raise ValueError(f"Failed to retrieve project data: {e}")
 
-def save_agent_output(project_id, agent_name, output):
-    """Save agent output to MongoDB."""
+def save_agent_output(project_id, agent_name, output, input_hash=None):
+    """Save agent output to MongoDB, with the hash of the inputs it was generated from."""
     try:
-        client = get_mongo_client()
-        db = client[settings.MONGO_DB_NAME]
-        collection = db['agent_outputs']
+        collection = get_db()['agent_outputs']
         document = {
             "project_id": project_id,
             "agent_name": agent_name,
             "output": output,
             "timestamp": datetime.now()
         }
+        if input_hash is not None:
+            document["input_hash"] = input_hash
         result = collection.insert_one(document)
-        client.close()
         return result.inserted_id
     except Exception as e:
         raise ValueError(f"Failed to save agent output: {e}")
+
+def get_latest_agent_output(project_id, agent_name):
+    """Return the most recently saved output of an agent for a project, or None."""
+    try:
+        collection = get_db()['agent_outputs']
+        document = collection.find_one(
+            {"project_id": project_id, "agent_name": agent_name},
+            sort=[("timestamp", -1)]
+        )
+        return document["output"] if document else None
+    except Exception as e:
+        raise ValueError(f"Failed to retrieve agent output: {e}")
+
+def get_memoized_output(project_id, agent_name, input_hash):
+    """Return the agent's latest output for the project if it was generated from input_hash, else None."""
+    try:
+        collection = get_db()['agent_outputs']
+        document = collection.find_one(
+            {"project_id": project_id, "agent_name": agent_name},
+            {"output": 1, "input_hash": 1},
+            sort=[("timestamp", -1)]
+        )
+        if document and document.get("input_hash") == input_hash:
+            return document["output"]
+        return None
+    except Exception as e:
+        raise ValueError(f"Failed to retrieve agent output: {e}")
 def get_all_developers():
     """Retrieve all developers from MongoDB."""
     try:
-        client = get_mongo_client()
-        db = client[settings.MONGO_DB_NAME]
-        collection = db['developers']
+        collection = get_db()['developers']
         data = list(collection.find({}, {"_id": 0}))  # exclude _id for clean JSON
-        client.close()
         return data
     except Exception as e:
         raise ValueError(f"Failed to retrieve developers: {e}")
+def save_user_stories(project_id, epics_stories):
+    """Store epics and stories as the project's approved set, as the save-epics endpoint does."""
+    try:
+        get_db()['project_epics_stories'].update_one(
+            {"project_id": project_id},
+            {"$set": {"epics_stories": epics_stories, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        raise ValueError(f"Failed to save epics_stories: {e}")
 def get_user_stories(project_id):
-    client = get_mongo_client()
-    db = client[settings.MONGO_DB_NAME]
-    collection = db['project_epics_stories']
+    collection = get_db()['project_epics_stories']
     doc = collection.find_one({"project_id": project_id})
-    client.close()
     if not doc or "epics_stories" not in doc:
         raise ValueError(f"No epics_stories found for project_id {project_id}")
     # Adapt to the expected format
@@ -81,4 +174,3 @@ def get_user_stories(project_id):
             "user_stories": doc["epics_stories"].get("user_stories", [])
         }
     }
-
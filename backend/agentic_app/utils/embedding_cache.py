@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import numpy as np
+import xxhash
+from bson.binary import Binary
+from pymongo.errors import BulkWriteError
+from cachetools import LRUCache
+from django.conf import settings
+from agentic_app.utils.db import get_db
+from agentic_app.utils.rag import get_shared_encoder
+from agentic_app.utils.team_prompt import normalize_skill, story_text
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Embeddings of skill names and user stories, made with the RAG's sentence encoder
+# and cached by content hash: in process (LRU) and in the Mongo
+# embedding_cache collection, as raw float32 bytes. A text is only re-encoded
+# when it changes, or when the encoder model or backend changes.
+
+_memory = None
+_memory_lock = threading.Lock()
+_stats = {"memory_hits": 0, "mongo_hits": 0, "encoded": 0}
+
+def _encoder_namespace(encoder):
+    return f"{getattr(encoder, 'model_name', '')}:{getattr(encoder, 'backend', '')}"
+
+def content_hash(text, namespace=""):
+    """xxh3-128 hex digest of an encoder namespace and a text."""
+    return xxhash.xxh3_128_hexdigest(f"{namespace}\x00{text}".encode("utf-8"))
+
+def _memory_cache():
+    global _memory
+    if _memory is None:
+        _memory = LRUCache(maxsize=max(1, getattr(settings, "EMBEDDING_CACHE_SIZE", 50000)))
+    return _memory
+
+def embed_texts(texts):
+    """Unit-normalized float32 embeddings of texts, one row per text."""
+    encoder = get_shared_encoder()
+    namespace = _encoder_namespace(encoder)
+    keys = [content_hash(text, namespace) for text in texts]
+    vectors = {}
+    with _memory_lock:
+        cache = _memory_cache()
+        for key in set(keys):
+            vector = cache.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        _stats["memory_hits"] += len(vectors)
+
+    missing = [key for key in set(keys) if key not in vectors]
+    collection = get_db()["embedding_cache"]
+    if missing:
+        found = 0
+        for doc in collection.find({"_id": {"$in": missing}}, {"vector": 1}):
+            vectors[doc["_id"]] = np.frombuffer(doc["vector"], dtype=np.float32)
+            found += 1
+        with _memory_lock:
+            _stats["mongo_hits"] += found
+
+    to_encode = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            to_encode.setdefault(key, text)
+    if to_encode:
+        embeddings = np.asarray(encoder.encode(list(to_encode.values())), dtype=np.float32)
+        embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        docs = []
+        for key, vector in zip(to_encode, embeddings):
+            vectors[key] = vector
+            docs.append({"_id": key, "namespace": namespace, "vector": Binary(vector.tobytes())})
+        try:
+            collection.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            # Another process cached some of the same texts first
+            pass
+        with _memory_lock:
+            _stats["encoded"] += len(docs)
+
+    with _memory_lock:
+        cache = _memory_cache()
+        for key, vector in vectors.items():
+            cache[key] = vector
+    if not texts:
+        return np.zeros((0, getattr(encoder, "dimension", 0)), dtype=np.float32)
+    return np.stack([vectors[key] for key in keys])
+
+def semantic_affinity(stories, developers, floor=None):
+    """Stories x developers embedding affinity in [0, 1].
+
+    Each developer is represented by the normalized mean of their skill
+    embeddings, so the cosine of all pairs is one matrix multiply. Unrelated
+    texts still score around 0.2-0.5 with MiniLM, so cosines at or below
+    floor (default TEAM_MATCHER_SEMANTIC_FLOOR) map to 0 and the rest are
+    rescaled linearly to (0, 1]. Developers without skills get zero affinity.
+    """
+    if floor is None:
+        floor = getattr(settings, "TEAM_MATCHER_SEMANTIC_FLOOR", 0.5)
+    skills = sorted({normalize_skill(s) for d in developers for s in d.get("skills", []) if normalize_skill(s)})
+    affinity = np.zeros((len(stories), len(developers)), dtype=np.float32)
+    if not stories or not skills:
+        return affinity
+    column = {skill: j for j, skill in enumerate(skills)}
+    skill_vectors = embed_texts(skills)
+    story_vectors = embed_texts([story_text(story) for story in stories])
+
+    membership = np.zeros((len(developers), len(skills)), dtype=np.float32)
+    for i, developer in enumerate(developers):
+        for skill in developer.get("skills", []):
+            j = column.get(normalize_skill(skill))
+            if j is not None:
+                membership[i, j] = 1.0
+    developer_vectors = membership @ skill_vectors
+    developer_vectors /= np.clip(np.linalg.norm(developer_vectors, axis=1, keepdims=True), 1e-12, None)
+    cosine = story_vectors @ developer_vectors.T
+    np.clip((cosine - floor) / max(1.0 - floor, 1e-6), 0.0, 1.0, out=affinity)
+    return affinity
+
+def get_embedding_cache_stats():
+    with _memory_lock:
+        stats = dict(_stats)
+        stats["memory_size"] = len(_memory) if _memory is not None else 0
+    return stats
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import numpy as np
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Pluggable sentence encoders for the RAG store. Every backend exposes
+# encode(texts) -> float32 matrix and a dimension attribute, and produces
+# embeddings comparable to SentenceTransformer(model_name).encode. Heavy
+# libraries are imported by the backend that needs them, so the ONNX backends
+# never import torch.
+ENCODER_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+class SentenceTransformerEncoder:
+    """Reference fp32 encoder using sentence-transformers on torch."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        embeddings = self.model.encode(texts, batch_size=max(1, len(texts)), convert_to_numpy=True)
+        return np.ascontiguousarray(embeddings, dtype='float32')
+
+class QuantizedTorchEncoder(SentenceTransformerEncoder):
+    """sentence-transformers with its Linear layers dynamically quantized to int8."""
+
+    def __init__(self, model_name):
+        super().__init__(model_name)
+        import torch
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class OnnxEncoder:
+    """ONNX Runtime encoder for sentence-transformers models, without torch.
+
+    Downloads the model's exported ONNX graph and tokenizer from the Hugging Face
+    Hub, then reproduces the sentence-transformers pipeline: mean pooling over the
+    attention mask followed by L2 normalisation (when the model normalises). With
+    quantize=True the graph is dynamically quantized to int8 once and cached.
+    """
+
+    def __init__(self, model_name, quantize=False, max_length=256, threads=None):
+        try:
+            import onnxruntime as ort
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ValueError(f"The ONNX encoder requires onnxruntime, tokenizers and huggingface_hub: {e}")
+
+        repo_id = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+        self.model_name = model_name
+        model_path = hf_hub_download(repo_id, 'onnx/model.onnx')
+        if quantize:
+            model_path = self._quantized(model_path)
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.normalize = self._model_normalizes(repo_id, hf_hub_download)
+        self.dimension = self.encode(["dimension probe"]).shape[1]
+
+    @staticmethod
+    def _quantized(model_path):
+        """Return the path of an int8 copy of model_path, creating it on first use."""
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantized_path = os.path.splitext(model_path)[0] + '.qint8.onnx'
+        if not os.path.exists(quantized_path):
+            tmp_path = quantized_path + '.tmp'
+            quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    @staticmethod
+    def _model_normalizes(repo_id, hf_hub_download):
+        """Check modules.json for a Normalize layer, as sentence-transformers would."""
+        try:
+            with open(hf_hub_download(repo_id, 'modules.json'), 'r', encoding='utf-8') as f:
+                return any(m.get('type', '').endswith('Normalize') for m in json.load(f))
+        except Exception:
+            return False
+
+    def encode(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return np.ascontiguousarray(embeddings, dtype='float32')
+
+def get_encoder(backend=None, model_name='all-MiniLM-L6-v2'):
+    """Create the encoder for backend (default: settings.RAG_ENCODER_BACKEND)."""
+    if backend is None:
+        from django.conf import settings
+        backend = getattr(settings, "RAG_ENCODER_BACKEND", "torch")
+    try:
+        if backend == 'torch':
+            encoder = SentenceTransformerEncoder(model_name)
+        elif backend == 'torch-int8':
+            encoder = QuantizedTorchEncoder(model_name)
+        elif backend == 'onnx':
+            encoder = OnnxEncoder(model_name)
+        elif backend == 'onnx-int8':
+            encoder = OnnxEncoder(model_name, quantize=True)
+        else:
+            raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
+        encoder.backend = backend
+        return encoder
+    except Exception as e:
+        raise ValueError(f"Failed to initialize {backend} encoder: {e}")
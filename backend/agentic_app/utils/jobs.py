@@ -0,0 +1,333 @@
+import os
+import sys
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from django.conf import settings
+from pymongo import ASCENDING, ReturnDocument
+from agentic_app.utils.db import get_db
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Job queue backed by the jobs collection. A job moves queued -> running ->
+# succeeded | failed | timed_out | cancelled. Workers claim the oldest queued
+# job with a find_one_and_update, so any number of worker threads and
+# processes can share the queue with only MongoDB between them. A running job
+# carries its worker's name and a heartbeat; jobs whose worker stopped
+# heartbeating are requeued (or failed after JOBS_MAX_ATTEMPTS). Finished jobs
+# expire after JOBS_RESULT_TTL seconds.
+
+FINISHED_STATUSES = ("succeeded", "failed", "timed_out", "cancelled")
+
+_indexes_ready = False
+
+def _jobs_collection():
+    """Return the jobs collection, creating its indexes once per process."""
+    global _indexes_ready
+    collection = get_db()["jobs"]
+    if not _indexes_ready:
+        collection.create_index([("status", ASCENDING), ("kind", ASCENDING), ("created_at", ASCENDING)])
+        collection.create_index("expires_at", expireAfterSeconds=0)
+        _indexes_ready = True
+    return collection
+
+def job_timeout(timeout=None):
+    """Seconds a job may run: timeout capped at JOBS_MAX_TIMEOUT, or the default if unset.
+
+    Raises ValueError if timeout is not a positive number.
+    """
+    limit = getattr(settings, "JOBS_MAX_TIMEOUT", 3600)
+    if timeout is None or timeout == "":
+        return min(getattr(settings, "JOBS_DEFAULT_TIMEOUT", 600), limit)
+    try:
+        if isinstance(timeout, bool):
+            raise TypeError
+        seconds = float(timeout)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timeout_seconds {timeout!r}: expected a positive number of seconds")
+    if not seconds > 0:
+        raise ValueError(f"Invalid timeout_seconds {timeout!r}: expected a positive number of seconds")
+    return min(seconds, limit)
+
+def enqueue_job(kind, payload, timeout=None):
+    """Queue a job of kind with payload; returns the job document."""
+    job = {
+        "_id": uuid.uuid4().hex,
+        "kind": kind,
+        "payload": payload,
+        "status": "queued",
+        "timeout_seconds": job_timeout(timeout),
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+    }
+    try:
+        _jobs_collection().insert_one(job)
+    except Exception as e:
+        raise ValueError(f"Failed to enqueue {kind} job: {e}")
+    return job
+
+def get_job(job_id):
+    try:
+        return _jobs_collection().find_one({"_id": job_id})
+    except Exception as e:
+        raise ValueError(f"Failed to retrieve job {job_id}: {e}")
+
+def job_summary(job):
+    """Client view of a job: status and timing, plus the result or error once finished."""
+    summary = {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "timeout_seconds": job.get("timeout_seconds"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+    if job.get("cancel_requested") and job["status"] == "running":
+        summary["cancel_requested"] = True
+    if job["status"] == "succeeded":
+        summary["result"] = job.get("result")
+    elif job.get("error"):
+        summary["error"] = job["error"]
+    return summary
+
+def cancel_job(job_id):
+    """Cancel a job; returns the updated document, or None if there is no such job.
+
+    A queued job is cancelled at once. A running job is flagged, and its
+    worker marks it cancelled at its next heartbeat and stops waiting for it;
+    the agent call itself cannot be interrupted, so work it has already
+    saved stays saved. Finished jobs are returned unchanged.
+    """
+    collection = _jobs_collection()
+    now = datetime.utcnow()
+    job = collection.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "cancelled", "finished_at": now, "expires_at": _expires_at(now)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        job = collection.find_one_and_update(
+            {"_id": job_id, "status": "running"},
+            {"$set": {"cancel_requested": True}},
+            return_document=ReturnDocument.AFTER,
+        )
+    return job if job is not None else collection.find_one({"_id": job_id})
+
+def _expires_at(now):
+    return now + timedelta(seconds=getattr(settings, "JOBS_RESULT_TTL", 604800))
+
+def claim_job(worker, kinds):
+    """Atomically move the oldest queued job of one of kinds to running for worker."""
+    now = datetime.utcnow()
+    return _jobs_collection().find_one_and_update(
+        {"status": "queued", "kind": {"$in": list(kinds)}},
+        {"$set": {"status": "running", "worker": worker, "started_at": now, "heartbeat_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+def heartbeat(job_id, worker):
+    """Record that worker is still running job_id; returns None if the job is no longer its own."""
+    return _jobs_collection().find_one_and_update(
+        {"_id": job_id, "status": "running", "worker": worker},
+        {"$set": {"heartbeat_at": datetime.utcnow()}},
+        projection={"cancel_requested": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+def finish_job(job_id, worker, status, result=None, error=None):
+    """Record a job's outcome if worker still owns it; returns True if recorded."""
+    now = datetime.utcnow()
+    update = {"status": status, "finished_at": now, "expires_at": _expires_at(now)}
+    if result is not None:
+        update["result"] = result
+    if error is not None:
+        update["error"] = error
+    outcome = _jobs_collection().update_one(
+        {"_id": job_id, "status": "running", "worker": worker},
+        {"$set": update, "$unset": {"heartbeat_at": ""}},
+    )
+    return outcome.modified_count == 1
+
+def job_is_live(job_id):
+    """True while job_id is running and not asked to cancel; handlers check it before saving."""
+    job = _jobs_collection().find_one({"_id": job_id}, {"status": 1, "cancel_requested": 1})
+    return job is not None and job["status"] == "running" and not job.get("cancel_requested")
+
+def requeue_stale_jobs():
+    """Requeue running jobs whose worker stopped heartbeating; fail them after JOBS_MAX_ATTEMPTS."""
+    collection = _jobs_collection()
+    now = datetime.utcnow()
+    stale = {"status": "running",
+             "heartbeat_at": {"$lt": now - timedelta(seconds=getattr(settings, "JOBS_HEARTBEAT_TIMEOUT", 60))}}
+    max_attempts = getattr(settings, "JOBS_MAX_ATTEMPTS", 2)
+    requeued = collection.update_many(
+        dict(stale, attempts={"$lt": max_attempts}, cancel_requested={"$ne": True}),
+        {"$set": {"status": "queued"}, "$unset": {"worker": "", "started_at": "", "heartbeat_at": ""}},
+    ).modified_count
+    collection.update_many(
+        dict(stale, cancel_requested=True),
+        {"$set": {"status": "cancelled", "error": "Cancelled", "finished_at": now, "expires_at": _expires_at(now)}},
+    )
+    abandoned = collection.update_many(
+        stale,
+        {"$set": {"status": "failed", "error": "Worker stopped responding", "finished_at": now,
+                  "expires_at": _expires_at(now)}},
+    ).modified_count
+    if requeued or abandoned:
+        print(f"Jobs: requeued {requeued} and failed {abandoned} jobs of unresponsive workers")
+    return requeued, abandoned
+
+def queue_metrics():
+    """Queue depth and job counts by status and kind, from the jobs collection."""
+    collection = _jobs_collection()
+    by_status, queued_by_kind = {}, {}
+    for doc in collection.aggregate([{"$group": {"_id": {"status": "$status", "kind": "$kind"}, "count": {"$sum": 1}}}]):
+        status, kind = doc["_id"]["status"], doc["_id"]["kind"]
+        by_status[status] = by_status.get(status, 0) + doc["count"]
+        if status == "queued":
+            queued_by_kind[kind] = doc["count"]
+    oldest = collection.find_one({"status": "queued"}, {"created_at": 1}, sort=[("created_at", ASCENDING)])
+    return {
+        "depth": by_status.get("queued", 0),
+        "running": by_status.get("running", 0),
+        "queued_by_kind": queued_by_kind,
+        "by_status": by_status,
+        "oldest_queued_seconds": (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0.0,
+    }
+
+class JobWorker:
+    """Runs queued jobs with handlers[kind](payload, job_id) on concurrency threads.
+
+    Each handler call runs on its own daemon thread while the worker thread
+    waits for it, heartbeating the job and checking for cancellation. A
+    handler that outlives its job's timeout (or is cancelled) is abandoned:
+    the job is finished and the worker moves on, and the handler's eventual
+    result is discarded. Handlers can call job_is_live(job_id) before
+    side effects. While as many abandoned handlers are still running as the
+    worker has threads, it claims no new jobs, so a stalled LLM cannot pile
+    up threads.
+    """
+
+    def __init__(self, handlers, concurrency=1, poll_interval=None, name=None):
+        self.handlers = handlers
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval or getattr(settings, "JOBS_POLL_INTERVAL", 1.0)
+        self.heartbeat_interval = max(1.0, getattr(settings, "JOBS_HEARTBEAT_TIMEOUT", 60) / 4)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {"claimed": 0, "succeeded": 0, "failed": 0, "timed_out": 0, "cancelled": 0, "busy": 0}
+        self._abandoned = []
+        self._last_reap = 0.0
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, wait=True):
+        """Stop claiming jobs; with wait, let the running ones finish first."""
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _abandoned_running(self):
+        with self._lock:
+            self._abandoned = [t for t in self._abandoned if t.is_alive()]
+            return len(self._abandoned)
+
+    def stats(self):
+        abandoned = self._abandoned_running()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["abandoned_running"] = abandoned
+        stats.update(worker=self.name, concurrency=self.concurrency, alive=any(t.is_alive() for t in self._threads))
+        return stats
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_reap > self.heartbeat_interval:
+                    self._last_reap = time.monotonic()
+                    requeue_stale_jobs()
+                if self._abandoned_running() >= self.concurrency:
+                    # Back off until abandoned handlers finish
+                    job = None
+                else:
+                    job = claim_job(self.name, self.handlers)
+            except Exception as e:
+                print(f"Warning: job worker {self.name} could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._count("claimed")
+            self._count("busy")
+            try:
+                self._run(job)
+            except Exception as e:
+                print(f"Warning: job {job['_id']} could not be recorded: {e}")
+            finally:
+                self._count("busy", -1)
+
+    def _run(self, job):
+        job_id, handler = job["_id"], self.handlers[job["kind"]]
+        future = Future()
+
+        def target():
+            try:
+                future.set_result(handler(job["payload"], job_id))
+            except BaseException as e:
+                future.set_exception(e)
+
+        thread = threading.Thread(target=target, name=f"job-{job_id[:8]}", daemon=True)
+        started = time.monotonic()
+        thread.start()
+        deadline = started + job["timeout_seconds"]
+        while True:
+            try:
+                result = future.result(timeout=max(0.0, min(self.heartbeat_interval, deadline - time.monotonic())))
+                status, outcome = "succeeded", {"result": result}
+            except FutureTimeout:
+                if time.monotonic() >= deadline:
+                    status, outcome = "timed_out", {"error": f"Timed out after {job['timeout_seconds']:g} seconds"}
+                else:
+                    state = heartbeat(job_id, self.name)
+                    if state is None:
+                        # Requeued or finished elsewhere; this run no longer counts
+                        status, outcome = None, None
+                    elif state.get("cancel_requested"):
+                        status, outcome = "cancelled", {"error": "Cancelled"}
+                    else:
+                        continue
+            except Exception as e:
+                status, outcome = "failed", {"error": str(e)}
+            break
+
+        if thread.is_alive():
+            with self._lock:
+                self._abandoned.append(thread)
+        if status is None:
+            print(f"Job {job_id} ({job['kind']}) was taken from {self.name}; dropping its result")
+            return
+        finish_job(job_id, self.name, status, **outcome)
+        self._count(status)
+        print(f"Job {job_id} ({job['kind']}) {status} in {time.monotonic() - started:.1f} s")
@@ -2,10 +2,18 @@ import os
 import sys
 import json
 import re
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from django.conf import settings
 import django
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
+from agentic_app.utils.db import get_db
 
 # Ensure the backend directory is in the Python path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,27 +29,500 @@ if __name__ == "__main__":
         print(f"Failed to configure Django settings: {e}")
         sys.exit(1)
 
-def initialize_gemini(model_name="gemini-1.5-flash"):
-    """Initialize LangChain Google Generative AI model."""
+DEFAULT_MODEL = "gemini-1.5-flash"
+DEFAULT_TEMPERATURE = 0.5
+
+# Per-process client registry: one warm ChatGoogleGenerativeAI (and its
+# gRPC/HTTP channel) per (model, temperature), shared by all requests.
+_clients = {}
+_semaphores = {}
+_registry_lock = threading.Lock()
+_metrics = {}
+
+def _reset_registry_after_fork():
+    """gRPC channels must not be shared across fork; children build their own."""
+    global _registry_lock, _flights_lock
+    _clients.clear()
+    _semaphores.clear()
+    _rate_limiters.clear()
+    _registry_lock = threading.Lock()
+    # Calls in flight in the parent never finish in the child
+    _flights.clear()
+    _flights_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_registry_after_fork)
+
+def _model_metrics(model_name):
+    """Return the (mutable) metrics dict of a model. Caller holds _registry_lock."""
+    if model_name not in _metrics:
+        _metrics[model_name] = {
+            "clients_created": 0,
+            "setup_seconds": 0.0,
+            "calls": 0,
+            "errors": 0,
+            "inference_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "rate_limit_wait_seconds": 0.0,
+        }
+    return _metrics[model_name]
+
+def initialize_gemini(model_name=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE):
+    """Return the shared LangChain Google Generative AI client for model_name and temperature."""
+    key = (model_name, temperature)
+    llm = _clients.get(key)
+    if llm is not None:
+        return llm
+    with _registry_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            try:
+                started = time.perf_counter()
+                llm = ChatGoogleGenerativeAI(
+                    model=model_name,
+                    google_api_key=settings.GEMINI_API_KEY,
+                    temperature=temperature
+                )
+                metrics = _model_metrics(model_name)
+                metrics["clients_created"] += 1
+                metrics["setup_seconds"] += time.perf_counter() - started
+                _clients[key] = llm
+            except Exception as e:
+                raise ValueError(f"Failed to initialize Gemini LLM: {e}")
+        return llm
+
+def _get_semaphore(model_name):
+    with _registry_lock:
+        if model_name not in _semaphores:
+            limit = getattr(settings, "LLM_MAX_CONCURRENCY", 4)
+            _semaphores[model_name] = threading.BoundedSemaphore(max(1, limit))
+        return _semaphores[model_name]
+
+class RateLimiter:
+    """Thread-safe token bucket allowing rate_per_minute calls, with bursts of up to burst."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, sleeping until one is available; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return True
+                wait = (1.0 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+_rate_limiters = {}
+
+def set_rate_limit(model_name, rate_per_minute, burst=1):
+    """Limit calls to model_name in this process to rate_per_minute (0 or None removes the limit)."""
+    with _registry_lock:
+        if rate_per_minute:
+            _rate_limiters[model_name] = RateLimiter(rate_per_minute, burst)
+        else:
+            _rate_limiters[model_name] = None
+
+def _get_rate_limiter(model_name):
+    with _registry_lock:
+        if model_name not in _rate_limiters:
+            rate = getattr(settings, "LLM_RATE_LIMIT_PER_MINUTE", 0)
+            _rate_limiters[model_name] = RateLimiter(rate, getattr(settings, "LLM_RATE_LIMIT_BURST", 1)) if rate else None
+        return _rate_limiters[model_name]
+
+@contextmanager
+def _llm_slot(model_name):
+    """Hold one of the model's LLM_MAX_CONCURRENCY slots and record the call's metrics.
+
+    Callers wait up to LLM_QUEUE_TIMEOUT seconds for a slot, after waiting for
+    the model's rate limit (LLM_RATE_LIMIT_PER_MINUTE), if any. Queue wait and
+    inference time are recorded separately from client setup time.
+    """
+    limiter = _get_rate_limiter(model_name)
+    if limiter is not None:
+        limited = time.perf_counter()
+        if not limiter.acquire(timeout=getattr(settings, "LLM_QUEUE_TIMEOUT", 120)):
+            raise ValueError(f"Timed out waiting for the {model_name} rate limit")
+        with _registry_lock:
+            _model_metrics(model_name)["rate_limit_wait_seconds"] += time.perf_counter() - limited
+    semaphore = _get_semaphore(model_name)
+    queued = time.perf_counter()
+    if not semaphore.acquire(timeout=getattr(settings, "LLM_QUEUE_TIMEOUT", 120)):
+        raise ValueError(f"Timed out waiting for a free {model_name} slot")
+    started = time.perf_counter()
+    with _registry_lock:
+        metrics = _model_metrics(model_name)
+        metrics["queue_wait_seconds"] += started - queued
+        metrics["in_flight"] += 1
+        metrics["max_in_flight"] = max(metrics["max_in_flight"], metrics["in_flight"])
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        semaphore.release()
+        with _registry_lock:
+            metrics["in_flight"] -= 1
+            metrics["calls"] += 1
+            metrics["errors"] += int(failed)
+            metrics["inference_seconds"] += elapsed
+
+def _prompt_chain(model):
+    prompt_template = ChatPromptTemplate.from_messages([("human", "{prompt}")])
+    return prompt_template | model
+
+def invoke_llm(prompt, model_name=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE, model=None):
+    """Send a prompt to Gemini through the shared client and return the response text.
+
+    At most LLM_MAX_CONCURRENCY calls per model are in flight in this process.
+    """
+    if model is None:
+        model = initialize_gemini(model_name, temperature)
+    else:
+        model_name = getattr(model, "model", model_name)
+
+    with _llm_slot(model_name):
+        return _prompt_chain(model).invoke({"prompt": prompt}).content
+
+def stream_llm(prompt, model_name=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE, model=None):
+    """Send a prompt to Gemini and yield the response text as it is generated.
+
+    The concurrency slot is held until the stream is exhausted or closed.
+    """
+    if model is None:
+        model = initialize_gemini(model_name, temperature)
+    else:
+        model_name = getattr(model, "model", model_name)
+
+    with _llm_slot(model_name):
+        for chunk in _prompt_chain(model).stream({"prompt": prompt}):
+            if chunk.content:
+                yield chunk.content
+
+def count_tokens(text, model_name=DEFAULT_MODEL, exact=None):
+    """Return the number of tokens text uses for model_name.
+
+    With exact (default: settings.LLM_EXACT_TOKEN_COUNT) the Gemini
+    count_tokens API is asked, which costs a round trip; otherwise, or if that
+    fails, the count is estimated at ~4 characters per token, which is close
+    for English and JSON.
+    """
+    if exact is None:
+        exact = getattr(settings, "LLM_EXACT_TOKEN_COUNT", False)
+    if exact:
+        try:
+            return initialize_gemini(model_name).get_num_tokens(text)
+        except Exception as e:
+            print(f"Warning: Exact token count failed, estimating instead: {e}")
+    return (len(text) + 3) // 4
+
+def parse_llm_json(content):
+    """Strip Markdown code fences from an LLM response and parse it as JSON."""
+    content = content.strip()
+    content = re.sub(r'^```(?:json)?\s*|\s*```$', '', content).strip()
     try:
-        llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            google_api_key=settings.GEMINI_API_KEY,
-            temperature=0.5
+        return json.loads(content)
+    except json.JSONDecodeError:
+        raise ValueError(f"Failed to parse LLM output as JSON: {content}")
+
+# Content-addressed response cache: an in-process LRU in front of a Mongo
+# collection whose TTL index expires entries after LLM_CACHE_TTL seconds.
+_response_cache = None
+_cache_lock = threading.Lock()
+_cache_indexes_ready = False
+_cache_stats = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "errors": 0}
+
+def cache_key(prompt, model_name=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE):
+    """Hash of model, temperature and the fully rendered prompt."""
+    payload = json.dumps([model_name, temperature, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _memory_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = TTLCache(
+            maxsize=max(1, getattr(settings, "LLM_CACHE_SIZE", 256)),
+            ttl=getattr(settings, "LLM_CACHE_TTL", 86400),
         )
-        return llm
+    return _response_cache
+
+def _cache_collection():
+    """Return the Mongo cache collection, creating its TTL index once per process."""
+    global _cache_indexes_ready
+    collection = get_db()["llm_cache"]
+    if not _cache_indexes_ready:
+        ttl = getattr(settings, "LLM_CACHE_TTL", 86400)
+        try:
+            collection.create_index("created_at", expireAfterSeconds=ttl)
+        except OperationFailure as e:
+            if e.code != 85:  # IndexOptionsConflict: the index exists with another TTL
+                raise
+            collection.database.command(
+                "collMod", collection.name, index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": ttl})
+            print(f"LLM cache TTL changed to {ttl} seconds")
+        _cache_indexes_ready = True
+    return collection
+
+def _cache_get(key):
+    with _cache_lock:
+        content = _memory_cache().get(key)
+        if content is not None:
+            _cache_stats["memory_hits"] += 1
+            return content
+    try:
+        doc = _cache_collection().find_one({"_id": key}, {"content": 1})
     except Exception as e:
-        raise ValueError(f"Failed to initialize Gemini LLM: {e}")
+        # The cache must never fail a request
+        print(f"Warning: LLM cache lookup failed: {e}")
+        _cache_stats["errors"] += 1
+        doc = None
+    with _cache_lock:
+        if doc is None:
+            _cache_stats["misses"] += 1
+            return None
+        _cache_stats["mongo_hits"] += 1
+        _memory_cache()[key] = doc["content"]
+    return doc["content"]
 
-def generate_idea_analysis(idea, team_metadata, rag_context=None, model=None):
-    """Generate concise structured analysis for a product idea."""
+def _cache_put(key, content, model_name, temperature):
+    with _cache_lock:
+        _memory_cache()[key] = content
+        _cache_stats["stores"] += 1
     try:
-        if model is None:
-            model = initialize_gemini()
-        
-        # Construct concise prompt with strict schema
-        context = rag_context if rag_context else "Use Agile methodology best practices."
-        prompt = f"""
+        _cache_collection().replace_one(
+            {"_id": key},
+            {"content": content, "model": model_name, "temperature": temperature, "created_at": datetime.utcnow()},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"Warning: LLM cache store failed: {e}")
+        _cache_stats["errors"] += 1
+
+class _Flight:
+    """One in-flight LLM call that concurrent identical callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+_flights = {}
+_flights_lock = threading.Lock()
+_flight_stats = {"leaders": 0, "coalesced": 0, "timeouts": 0, "errors": 0, "remote_waits": 0, "remote_hits": 0}
+
+def single_flight(key, fn, timeout=None):
+    """Run fn() once per key at a time; concurrent callers with the same key share its result.
+
+    The first caller runs fn; later callers block until it finishes (at most
+    timeout seconds, default LLM_SINGLE_FLIGHT_TIMEOUT) and receive the same
+    result, or the same exception if it failed. A timed-out waiter raises
+    ValueError; the call itself keeps running for the others. Coalescing here
+    is per process; generate_json adds a MongoDB lease (_leased_generate) for
+    identical calls in other worker processes.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "LLM_SINGLE_FLIGHT_TIMEOUT", 180)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+            _flight_stats["leaders"] += 1
+        else:
+            flight.waiters += 1
+            _flight_stats["coalesced"] += 1
+
+    if not leader:
+        if not flight.done.wait(timeout):
+            with _flights_lock:
+                _flight_stats["timeouts"] += 1
+            raise ValueError(f"Timed out after {timeout}s waiting for an identical in-flight LLM request")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fn()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        with _flights_lock:
+            _flight_stats["errors"] += 1
+        raise
+    finally:
+        # Unregister before waking waiters, so later callers start a fresh call
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+# Cross-process single flight: the leader of a cache key in one process takes a
+# lease document in llm_leases; leaders of the same key in other processes
+# wait for the response to appear in the Mongo cache tier instead of calling
+# the LLM again. Leases expire after LLM_SINGLE_FLIGHT_TIMEOUT seconds.
+_lease_indexes_ready = False
+
+def _lease_collection():
+    global _lease_indexes_ready
+    collection = get_db()["llm_leases"]
+    if not _lease_indexes_ready:
+        collection.create_index("expires_at", expireAfterSeconds=0)
+        _lease_indexes_ready = True
+    return collection
+
+def _acquire_lease(key, owner, seconds):
+    """Take the lease on key unless another process holds a live one."""
+    now = datetime.utcnow()
+    try:
+        _lease_collection().update_one(
+            {"_id": key, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+def _leased_generate(key, generate, timeout):
+    """Run generate() under the cross-process lease on key, or wait for its holder's cached response."""
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    deadline = time.monotonic() + timeout
+    try:
+        while not _acquire_lease(key, owner, timeout):
+            with _flights_lock:
+                _flight_stats["remote_waits"] += 1
+            # Another process is generating this response; poll the Mongo tier for it
+            while time.monotonic() < deadline:
+                time.sleep(0.5)
+                doc = _cache_collection().find_one({"_id": key}, {"content": 1})
+                if doc is not None:
+                    with _flights_lock:
+                        _flight_stats["remote_hits"] += 1
+                    return doc["content"]
+                if _lease_collection().find_one({"_id": key}, {"_id": 1}) is None:
+                    break  # holder finished without caching (it failed); try to take over
+            else:
+                raise ValueError(f"Timed out after {timeout}s waiting for an identical LLM request in another process")
+    except ValueError:
+        raise
+    except Exception as e:
+        # The lease is an optimization; never fail the call over it
+        print(f"Warning: LLM lease unavailable, calling the model directly: {e}")
+        return generate()
+    try:
+        return generate()
+    finally:
+        try:
+            _lease_collection().delete_one({"_id": key, "owner": owner})
+        except Exception as e:
+            print(f"Warning: Failed to release LLM lease: {e}")
+
+def generate_json(prompt, model_name=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE, use_cache=True, model=None):
+    """Return the parsed JSON response to prompt, served from the response cache when possible.
+
+    With use_cache=False the cache is not read (forced regeneration), but the
+    fresh response still replaces the cached one. Only responses that parse as
+    JSON are cached. Identical concurrent calls share one LLM call: within a
+    process through single_flight, and across processes through a MongoDB
+    lease when the cache is in use.
+    """
+    if model is not None:
+        model_name = getattr(model, "model", model_name)
+        temperature = getattr(model, "temperature", temperature)
+    key = cache_key(prompt, model_name, temperature)
+    if use_cache and getattr(settings, "LLM_CACHE_ENABLED", True):
+        content = _cache_get(key)
+        if content is not None:
+            return parse_llm_json(content)
+    elif not use_cache:
+        with _cache_lock:
+            _cache_stats["bypassed"] += 1
+
+    def generate():
+        content = invoke_llm(prompt, model_name, temperature, model=model)
+        parse_llm_json(content)  # validate before sharing or caching
+        if getattr(settings, "LLM_CACHE_ENABLED", True):
+            _cache_put(key, content, model_name, temperature)
+        return content
+
+    leased = generate
+    if use_cache and getattr(settings, "LLM_CACHE_ENABLED", True) \
+            and getattr(settings, "LLM_SINGLE_FLIGHT_ACROSS_PROCESSES", True):
+        timeout = getattr(settings, "LLM_SINGLE_FLIGHT_TIMEOUT", 180)
+        leased = lambda: _leased_generate(key, generate, timeout)
+
+    # Each caller parses its own copy, so callers may mutate the result freely
+    return parse_llm_json(single_flight(key, leased))
+
+def stream_json(prompt, model_name=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE, use_cache=True, model=None):
+    """Streaming counterpart of generate_json.
+
+    Yields ("token", text) events as the response is generated, then a final
+    ("result", parsed) event once the complete response has been parsed and
+    validated. A cached response is sent as a single token event. Streams are
+    not coalesced by single_flight, since every caller needs its own tokens.
+    """
+    if model is not None:
+        model_name = getattr(model, "model", model_name)
+        temperature = getattr(model, "temperature", temperature)
+    key = cache_key(prompt, model_name, temperature)
+    if use_cache and getattr(settings, "LLM_CACHE_ENABLED", True):
+        content = _cache_get(key)
+        if content is not None:
+            yield "token", content
+            yield "result", parse_llm_json(content)
+            return
+    elif not use_cache:
+        with _cache_lock:
+            _cache_stats["bypassed"] += 1
+
+    parts = []
+    for text in stream_llm(prompt, model_name, temperature, model=model):
+        parts.append(text)
+        yield "token", text
+    content = "".join(parts)
+    parsed = parse_llm_json(content)
+    if getattr(settings, "LLM_CACHE_ENABLED", True):
+        _cache_put(key, content, model_name, temperature)
+    yield "result", parsed
+
+def get_llm_metrics():
+    """Return per-model client setup, queueing and inference metrics for this process."""
+    with _registry_lock:
+        snapshot = {name: dict(values) for name, values in _metrics.items()}
+        clients = [{"model": name, "temperature": temp} for name, temp in _clients]
+    for values in snapshot.values():
+        values["avg_inference_seconds"] = values["inference_seconds"] / values["calls"] if values["calls"] else 0.0
+    with _cache_lock:
+        cache = dict(_cache_stats)
+        cache["memory_size"] = len(_response_cache) if _response_cache is not None else 0
+    lookups = cache["memory_hits"] + cache["mongo_hits"] + cache["misses"]
+    cache["hit_rate"] = (cache["memory_hits"] + cache["mongo_hits"]) / lookups if lookups else 0.0
+    with _flights_lock:
+        flights = dict(_flight_stats)
+        flights["in_flight"] = len(_flights)
+    return {"models": snapshot, "clients": clients, "cache": cache, "single_flight": flights, "pid": os.getpid()}
+
+def build_idea_prompt(idea, team_metadata, rag_context=None):
+    """Construct the concise idea analysis prompt with its strict output schema."""
+    context = rag_context if rag_context else "Use Agile methodology best practices."
+    prompt = f"""
 You are an AI assistant analyzing a product idea for Agile development.
 Given the idea and team metadata, provide a concise JSON output with ONLY:
 - domain: The product’s industry (e.g., Social Media).
@@ -66,24 +547,21 @@ Output in JSON format:
 }}
 ```
 """
-        
-        # Create prompt template
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("human", "{prompt}")
-        ])
-        
-        # Format and invoke
-        chain = prompt_template | model
-        response = chain.invoke({"prompt": prompt})
-        
-        # Strip ```json and ``` markers
-        content = response.content
-        content = re.sub(r'^```json\n|\n```$', '', content, flags=re.MULTILINE).strip()
-        
-        # Parse JSON response
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            raise ValueError(f"Failed to parse LLM output as JSON: {content}")
+    return prompt
+
+def generate_idea_analysis(idea, team_metadata, rag_context=None, model=None, use_cache=True):
+    """Generate concise structured analysis for a product idea."""
+    try:
+        prompt = build_idea_prompt(idea, team_metadata, rag_context)
+        # Invoke through the shared client and response cache, and parse JSON
+        return generate_json(prompt, model=model, use_cache=use_cache)
+    except Exception as e:
+        raise ValueError(f"Failed to generate idea analysis: {str(e)}")
+
+def stream_idea_analysis(idea, team_metadata, rag_context=None, use_cache=True):
+    """Generate the idea analysis as stream_json events."""
+    try:
+        prompt = build_idea_prompt(idea, team_metadata, rag_context)
+        yield from stream_json(prompt, use_cache=use_cache)
     except Exception as e:
         raise ValueError(f"Failed to generate idea analysis: {str(e)}")
\ No newline at end of file
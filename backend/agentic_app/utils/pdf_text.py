@@ -0,0 +1,72 @@
+import os
+import sys
+import xxhash
+from PyPDF2 import PdfReader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Text extraction helpers for RAG ingestion. This module deliberately avoids
+# importing Django settings, FAISS or the embedding model, so it is cheap to
+# import in ingestion worker processes.
+
+def iter_pdf_pages(reader, on_page=None):
+    """Yield the text of each page of a PdfReader, one page at a time."""
+    for i, page in enumerate(reader.pages):
+        page_text = page.extract_text()
+        if page_text:
+            yield page_text
+        else:
+            print(f"Warning: No text extracted from page {i + 1}")
+        if on_page:
+            on_page(i + 1)
+
+def iter_chunks(pages, chunk_size=500, chunk_overlap=50):
+    """Split a stream of page texts into chunks without joining the whole document.
+
+    The last chunk of each page is carried over and re-split together with the
+    next page, so chunks still span page boundaries while only one page plus the
+    carry is held in memory.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    carry = ""
+    for page_text in pages:
+        pieces = splitter.split_text(carry + page_text + "\n")
+        if not pieces:
+            continue
+        yield from pieces[:-1]
+        carry = pieces[-1] + "\n"
+    if carry.strip():
+        yield carry.strip()
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def extract_pdf_chunks(job):
+    """Process-pool worker: return (pdf_path, chunks, page_count) for one PDF.
+
+    job is a (pdf_path, chunk_size, chunk_overlap) tuple so it pickles cheaply.
+    """
+    pdf_path, chunk_size, chunk_overlap = job
+    reader = PdfReader(pdf_path)
+    chunks = list(iter_chunks(iter_pdf_pages(reader), chunk_size, chunk_overlap))
+    return pdf_path, chunks, len(reader.pages)
+
+def file_hash(path, block_size=1 << 20):
+    """xxh3-64 hex digest of a file's contents, read in blocks."""
+    digest = xxhash.xxh3_64()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
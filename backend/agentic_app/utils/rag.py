@@ -1,13 +1,20 @@
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from cachetools import TTLCache
 import os
 import sys
-import pickle
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from filelock import FileLock, Timeout
 from django.conf import settings
 import django
 from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from agentic_app.utils.chunk_store import ChunkStore, ChunkStoreWriter, chunk_id, store_exists, convert_pickle
+from agentic_app.utils.encoders import get_encoder
+from agentic_app.utils.pdf_text import iter_pdf_pages, iter_chunks, iter_batches, extract_pdf_chunks, file_hash
 
 # Ensure the backend directory is in the Python path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,94 +29,884 @@ if __name__ == "__main__":
         print(f"Failed to configure Django settings: {e}")
         sys.exit(1)
 
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# FAISS warns below ~39 training points per centroid; PQ needs that per code as well
+MIN_POINTS_PER_CENTROID = 39
+
+def get_index_config(**overrides):
+    """Return index build/search parameters from settings, with optional overrides."""
+    config = {
+        "index_type": getattr(settings, "RAG_INDEX_TYPE", "flat"),
+        "nlist": getattr(settings, "RAG_IVF_NLIST", 256),
+        "nprobe": getattr(settings, "RAG_IVF_NPROBE", 8),
+        "pq_m": getattr(settings, "RAG_PQ_M", 16),
+        "pq_nbits": getattr(settings, "RAG_PQ_NBITS", 8),
+        "hnsw_m": getattr(settings, "RAG_HNSW_M", 32),
+        "ef_construction": getattr(settings, "RAG_HNSW_EF_CONSTRUCTION", 200),
+        "ef_search": getattr(settings, "RAG_HNSW_EF_SEARCH", 64),
+    }
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if config["index_type"] not in INDEX_TYPES:
+        raise ValueError(f"Unknown RAG index type '{config['index_type']}', expected one of {INDEX_TYPES}")
+    return config
+
+def create_index(dimension, n_vectors, config):
+    """Create an untrained FAISS index of the configured type for a corpus of n_vectors.
+
+    IVF variants need enough vectors to train their quantizers. If the corpus is
+    too small, nlist is scaled down, and if even one list cannot be trained the
+    index falls back to Flat. Returns the index and the parameters actually used,
+    which are persisted next to the index.
+    """
+    params = dict(config, dimension=dimension, requested_index_type=config["index_type"])
+    index_type = config["index_type"]
+
+    if index_type in ('ivf_flat', 'ivf_pq'):
+        nlist = min(config["nlist"], n_vectors // MIN_POINTS_PER_CENTROID)
+        if index_type == 'ivf_pq':
+            # The product quantizer trains 2**nbits centroids per sub-vector
+            if n_vectors < MIN_POINTS_PER_CENTROID * (1 << config["pq_nbits"]) or dimension % config["pq_m"]:
+                nlist = 0
+        if nlist < 1:
+            print(f"Corpus of {n_vectors} vectors is too small to train {index_type}; using a flat index.")
+            index_type = 'flat'
+        else:
+            params["nlist"] = nlist
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == 'ivf_flat':
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_L2)
+    elif index_type == 'ivf_pq':
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], config["pq_m"], config["pq_nbits"])
+    else:
+        index = faiss.IndexHNSWFlat(dimension, config["hnsw_m"])
+        index.hnsw.efConstruction = config["ef_construction"]
+
+    params["index_type"] = index_type
+    # Chunks are addressed by their stable content-hash IDs, not by position
+    index = faiss.IndexIDMap2(index)
+    apply_search_defaults(index, params)
+    return index, params
+
+def unwrap_index(index):
+    """Return the index inside an IndexIDMap/IndexIDMap2 wrapper, downcast to its concrete type."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def index_ids(index):
+    """Return the chunk IDs stored in an index; positions for indexes without an ID map."""
+    wrapper = faiss.downcast_index(index)
+    if isinstance(wrapper, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(wrapper.id_map)
+    return np.arange(index.ntotal, dtype='int64')
+
+def apply_search_defaults(index, params):
+    """Set the default nprobe / efSearch stored in params on the index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = params.get("nprobe", 1)
+    hnsw = unwrap_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = params.get("ef_search", 16)
+
+def search_parameters(index, nprobe=None, ef_search=None):
+    """Build per-query FAISS search parameters; None keeps the index defaults.
+
+    Passing parameters per call leaves the shared index untouched, so concurrent
+    requests can use different recall/latency trade-offs.
+    """
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if ef_search is not None and isinstance(unwrap_index(index), faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+def read_index_mmap(index_path):
+    """Open a FAISS index memory-mapped and read-only where FAISS supports it.
+
+    IO_FLAG_MMAP_IFC maps the stored codes instead of copying them, so worker
+    processes share the pages through the OS page cache. Index types that cannot
+    be mapped are read normally.
+    """
+    flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(index_path, flags)
+    except RuntimeError:
+        return faiss.read_index(index_path)
+
+def params_path_for(index_path):
+    """Path of the JSON file holding the parameters an index was built with."""
+    return os.path.splitext(index_path)[0] + '.json'
+
+def training_sample_size(config):
+    """Number of vectors to collect before creating (and training) the index.
+
+    Flat and HNSW indexes need no training and are created from the first batch.
+    """
+    if config["index_type"] == 'ivf_flat':
+        wanted = config["nlist"] * MIN_POINTS_PER_CENTROID
+    elif config["index_type"] == 'ivf_pq':
+        wanted = max(config["nlist"], 1 << config["pq_nbits"]) * MIN_POINTS_PER_CENTROID
+    else:
+        return 1
+    return min(wanted, getattr(settings, "RAG_TRAIN_SAMPLE_SIZE", 50000))
+
+def published_store_dir(store_root='rag_store'):
+    """Directory of the version CURRENT points to under store_root, or the legacy backend root."""
+    store_root = os.path.join(settings.BASE_DIR, store_root)
+    pointer = os.path.join(store_root, 'CURRENT')
+    if os.path.exists(pointer):
+        with open(pointer, 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+        if name and os.path.isdir(os.path.join(store_root, name)):
+            return os.path.join(store_root, name)
+    return str(settings.BASE_DIR)
+
+def _print_progress(state):
+    print(f"Ingested {state['chunks']} new chunks ({state['skipped']} duplicates skipped) "
+          f"from {state['pages_done']}/{state['pages_total']} pages of {state['source']}")
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTL for search results.
+
+    Keys include the index version, so entries from an older index can never be
+    returned; invalidate() additionally drops them to free memory.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self._cache = TTLCache(maxsize=max(1, maxsize), ttl=ttl) if maxsize > 0 else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+
+    def get(self, key):
+        if self._cache is None:
+            self.misses += 1
+            return None
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self._cache is None:
+            return
+        with self._lock:
+            self._cache[key] = value
+
+    def invalidate(self):
+        with self._lock:
+            if self._cache is not None:
+                self._cache.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            size = len(self._cache) if self._cache is not None else 0
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": size,
+            "maxsize": self._cache.maxsize if self._cache is not None else 0,
+            "ttl": self._cache.ttl if self._cache is not None else 0,
+            "invalidations": self.invalidations,
+        }
+
+class IndexSnapshot:
+    """One published index version: the index, its chunks, parameters and location.
+
+    FAISSRAG swaps whole snapshots, so a search that took a reference to one never
+    sees the index of one version paired with the chunks of another.
+    """
+
+    def __init__(self, index=None, documents=None, params=None, store_dir=None, version=0):
+        self.index = index
+        self.documents = documents if documents is not None else []
+        self.params = params or {}
+        self.store_dir = store_dir
+        self.version = version
+
+class StorePaths:
+    """File locations of an index version inside store_dir."""
+
+    def __init__(self, store_dir, index_name, docs_name):
+        self.store_dir = store_dir
+        self.index_path = os.path.join(store_dir, index_name)
+        self.docs_path = os.path.join(store_dir, docs_name)
+        self.params_path = params_path_for(self.index_path)
+        self.manifest_path = self.docs_path + '.sources.json'
+
+    def exists(self):
+        return os.path.exists(self.index_path) and store_exists(self.docs_path)
+
 class FAISSRAG:
-    def __init__(self, model_name='all-MiniLM-L6-v2', index_path='faiss_index.index', docs_path='documents.pkl'):
-        """Initialize FAISS index, document storage, and sentence transformer model."""
-        self.model = SentenceTransformer(model_name)
-        self.index_path = os.path.join(settings.BASE_DIR, index_path)
-        self.docs_path = os.path.join(settings.BASE_DIR, docs_path)
-        self.documents = []
-        self.index = None
+    """FAISS retrieval over chunked documents, with versioned, hot-swappable indexes.
+
+    Each build writes a new version directory under store_root and publishes it
+    by atomically replacing the CURRENT pointer file, then swapping the in-memory
+    snapshot. Searches keep using the previous snapshot until the swap. Before the
+    first versioned build, the index and chunks at the backend root are used.
+    """
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', index_path='faiss_index.index', docs_path='documents',
+                 index_type=None, encoder_backend=None, store_root='rag_store'):
+        """Initialize FAISS index, document storage, and the sentence encoder."""
+        self.encoder = get_encoder(encoder_backend, model_name)
+        self.index_name = index_path
+        self.docs_name = docs_path
+        self.store_root = os.path.join(settings.BASE_DIR, store_root)
+        self.index_config = get_index_config(index_type=index_type)
+        self.query_cache = QueryCache(
+            getattr(settings, "RAG_QUERY_CACHE_SIZE", 1024),
+            getattr(settings, "RAG_QUERY_CACHE_TTL", 3600),
+        )
+        self._snapshot = IndexSnapshot()
+        self._swap_lock = threading.Lock()
         self.load_index_and_documents()
 
+    # Read-only views of the live snapshot
+    @property
+    def index(self):
+        return self._snapshot.index
+
+    @property
+    def documents(self):
+        return self._snapshot.documents
+
+    @property
+    def index_params(self):
+        return self._snapshot.params
+
+    @property
+    def index_version(self):
+        return self._snapshot.version
+
+    @property
+    def store_dir(self):
+        return self._snapshot.store_dir
+
+    def _paths(self, store_dir):
+        return StorePaths(store_dir, self.index_name, self.docs_name)
+
+    def current_store_dir(self):
+        """Directory of the published index version, or the legacy backend root."""
+        return published_store_dir(self.store_root)
+
+    def is_stale(self):
+        """True if another process has published a newer version than the live one."""
+        return self.current_store_dir() != self.store_dir
+
     def load_index_and_documents(self):
-        """Load FAISS index and documents if they exist."""
+        """Memory-map the published FAISS index and chunk store, if they exist, and swap them in."""
         try:
-            if os.path.exists(self.index_path) and os.path.exists(self.docs_path):
-                self.index = faiss.read_index(self.index_path)
-                with open(self.docs_path, 'rb') as f:
-                    self.documents = pickle.load(f)
-                print(f"Loaded FAISS index and {len(self.documents)} documents from disk.")
-            else:
-                self.index = None
-                self.documents = []
+            store_dir = self.current_store_dir()
+            paths = self._paths(store_dir)
+            legacy_pickle = paths.docs_path + '.pkl'
+            if not store_exists(paths.docs_path) and os.path.exists(legacy_pickle):
+                # One-time migration of the old pickled document list
+                count = convert_pickle(legacy_pickle, paths.docs_path)
+                print(f"Converted {count} documents from {legacy_pickle} to a chunk store.")
+            self._swap(self._open_snapshot(paths))
         except Exception as e:
             raise ValueError(f"Failed to load FAISS index or documents: {e}")
 
-    def load_pdf_and_embed(self, pdf_path):
-        """Load PDF, extract text, split into chunks, embed, and save to FAISS and pickle."""
+    def _open_snapshot(self, paths):
+        if not paths.exists():
+            return IndexSnapshot(store_dir=paths.store_dir)
+        index = read_index_mmap(paths.index_path)
+        documents = ChunkStore(paths.docs_path)
+        # Indexes written before parameters were persisted are plain Flat indexes
+        params = {"index_type": "flat", "dimension": index.d}
+        if os.path.exists(paths.params_path):
+            with open(paths.params_path, 'r', encoding='utf-8') as f:
+                params = json.load(f)
+        apply_search_defaults(index, params)
+        built_with = params.get("encoder", "torch")
+        if built_with != self.encoder.backend:
+            print(f"Warning: index was built with the {built_with} encoder but queries use "
+                  f"{self.encoder.backend}; rebuild it for best recall.")
+        print(f"Loaded FAISS index and {len(documents)} documents from {paths.store_dir}.")
+        return IndexSnapshot(index, documents, params, paths.store_dir)
+
+    def _swap(self, snapshot):
+        """Atomically make snapshot the live index and drop cached results of the old one."""
+        with self._swap_lock:
+            snapshot.version = self._snapshot.version + 1
+            self._snapshot = snapshot
+            self.query_cache.invalidate()
+
+    def load_pdf_and_embed(self, pdf_path, batch_size=None, progress=None):
+        """Stream a PDF into a fresh FAISS index and chunk store, replacing the current ones.
+
+        Pages are extracted, chunked and embedded in batches of batch_size chunks
+        that are added to the index incrementally, so peak memory depends on the
+        batch size rather than on the document size. progress, if given, is called
+        with a dict of counters after every batch. The result is published as a new
+        version; searches use the previous one until it is ready.
+        """
         try:
             pdf_path = os.path.join(settings.BASE_DIR, pdf_path)
             if not os.path.exists(pdf_path):
                 raise FileNotFoundError(f"PDF file not found at: {pdf_path}")
 
-            # Extract text from PDF
             reader = PdfReader(pdf_path)
-            text = ""
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-                else:
-                    print(f"Warning: No text extracted from page {i + 1}")
-
-            if not text.strip():
-                raise ValueError("No text extracted from PDF. It may be scanned or encrypted.")
-
-            # Split text into chunks
-            splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-            self.documents = splitter.split_text(text)
-
-            if not self.documents:
-                raise ValueError("No document chunks created after splitting.")
-
-            # Generate embeddings
-            embeddings = self.model.encode(self.documents, convert_to_numpy=True)
-
-            # Initialize FAISS index
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(embeddings)
-
-            # Save index and documents to disk
-            faiss.write_index(self.index, self.index_path)
-            with open(self.docs_path, 'wb') as f:
-                pickle.dump(self.documents, f)
-            print(f"Embedded and stored {len(self.documents)} chunks from PDF into {self.index_path} and {self.docs_path}")
+            state = self._new_progress_state(pdf_path, pages_total=len(reader.pages))
+
+            def on_page(page_number):
+                state["pages_done"] = page_number
+
+            def build(target, base):
+                chunks = iter_chunks(iter_pdf_pages(reader, on_page=on_page), *self._chunk_settings())
+                if not self._ingest_chunks(chunks, target, base=None, batch_size=batch_size,
+                                           progress=progress, state=state):
+                    raise ValueError("No text extracted from PDF. It may be scanned or encrypted.")
+
+            self._build_version(build)
+            print(f"Embedded and stored {len(self.documents)} chunks from PDF into {self.store_dir}")
         except Exception as e:
             raise ValueError(f"Failed to load and embed PDF: {e}")
 
-    def search(self, query, k=3):
-        """Search for top-k relevant documents for a given query."""
+    def ingest_directory(self, directory, workers=None, batch_size=None, progress=None, force=False):
+        """Add every PDF under directory to the existing index and chunk store.
+
+        Page extraction and chunking run in a process pool. Documents whose file
+        hash is unchanged since the last run are skipped outright, and chunks whose
+        content hash is already in the index are not embedded again, so re-running
+        after adding one document only costs that document's work. The result is
+        published as a new version. Returns a summary dict.
+        """
         try:
-            if self.index is None or not self.documents:
-                raise ValueError("FAISS index or documents not initialized. Call load_pdf_and_embed first.")
-            
-            # Encode the query
-            query_embedding = self.model.encode([query], convert_to_numpy=True)
-            # Search FAISS index
-            distances, indices = self.index.search(query_embedding, k)
-            # Retrieve matching documents
-            results = [(self.documents[idx], distances[0][i]) for i, idx in enumerate(indices[0]) if idx < len(self.documents)]
-            return results
+            directory = os.path.join(settings.BASE_DIR, directory)
+            if not os.path.isdir(directory):
+                raise FileNotFoundError(f"Directory not found at: {directory}")
+
+            manifest = self._load_manifest(self._paths(self.current_store_dir()))
+            pdf_paths = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(directory)
+                for name in names if name.lower().endswith('.pdf')
+            )
+            hashes = {path: file_hash(path) for path in pdf_paths}
+            todo = [path for path in pdf_paths
+                    if force or manifest.get(self._manifest_key(path), {}).get("hash") != hashes[path]]
+            state = self._new_progress_state(directory, documents_total=len(pdf_paths),
+                                             documents_unchanged=len(pdf_paths) - len(todo))
+            if not todo:
+                print(f"All {len(pdf_paths)} documents in {directory} are already ingested.")
+                return state
+
+            chunk_size, chunk_overlap = self._chunk_settings()
+            jobs = [(path, chunk_size, chunk_overlap) for path in todo]
+            workers = workers or getattr(settings, "RAG_INGEST_WORKERS", None) or os.cpu_count() or 1
+
+            def document_chunks(executor):
+                for pdf_path, chunks, page_count in executor.map(extract_pdf_chunks, jobs):
+                    state["pages_total"] += page_count
+                    state["pages_done"] += page_count
+                    state["source"] = pdf_path
+                    manifest[self._manifest_key(pdf_path)] = {
+                        "hash": hashes[pdf_path],
+                        "chunks": len(chunks),
+                        "ingested_at": time.time(),
+                    }
+                    state["documents_done"] += 1
+                    yield from chunks
+
+            def build(target, base):
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+                    self._ingest_chunks(document_chunks(executor), target, base=base,
+                                        batch_size=batch_size, progress=progress, state=state)
+                self._save_manifest(target, manifest)
+
+            self._build_version(build)
+            print(f"Ingested {state['chunks']} new chunks from {len(todo)} documents; "
+                  f"{state['skipped']} duplicate chunks skipped.")
+            return state
+        except Exception as e:
+            raise ValueError(f"Failed to ingest documents: {e}")
+
+    def _build_version(self, build):
+        """Run build(target, base) into a new version directory and publish it.
+
+        A file lock under store_root ensures only one build runs at a time across
+        all worker processes; a second concurrent build fails fast instead of
+        racing on the same files. On failure the partial version is removed and
+        the live index is untouched.
+        """
+        os.makedirs(self.store_root, exist_ok=True)
+        lock = FileLock(os.path.join(self.store_root, '.build.lock'))
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            raise ValueError("Another index build is already running.")
+        try:
+            base = self._paths(self.current_store_dir())
+            name = f"v{time.time_ns()}"
+            target = self._paths(os.path.join(self.store_root, name))
+            os.makedirs(target.store_dir)
+            try:
+                build(target, base if base.exists() else None)
+                snapshot = self._open_snapshot(target)
+            except Exception:
+                shutil.rmtree(target.store_dir, ignore_errors=True)
+                raise
+            # Publish for other processes, then for this one
+            pointer = os.path.join(self.store_root, 'CURRENT')
+            with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(name)
+            os.replace(pointer + '.tmp', pointer)
+            self._swap(snapshot)
+            self._prune_versions(keep=name)
+        finally:
+            lock.release()
+
+    def _prune_versions(self, keep):
+        """Delete old version directories beyond RAG_KEEP_VERSIONS, never the live one.
+
+        Processes that have not reloaded yet may still map files of an old version;
+        POSIX keeps unlinked files alive for them, and on platforms that refuse to
+        delete open files the directory is left for a later prune.
+        """
+        retain = max(1, getattr(settings, "RAG_KEEP_VERSIONS", 3))
+        versions = sorted(name for name in os.listdir(self.store_root)
+                          if name.startswith('v') and os.path.isdir(os.path.join(self.store_root, name)))
+        for name in versions[:-retain]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.store_root, name), ignore_errors=True)
+
+    def _chunk_settings(self):
+        return getattr(settings, "RAG_CHUNK_SIZE", 500), getattr(settings, "RAG_CHUNK_OVERLAP", 50)
+
+    def _new_progress_state(self, source, **counters):
+        state = {"source": source, "pages_total": 0, "pages_done": 0, "chunks": 0, "skipped": 0,
+                 "documents_total": 0, "documents_done": 0, "documents_unchanged": 0}
+        state.update(counters)
+        return state
+
+    def _ingest_chunks(self, chunks, target, base=None, batch_size=None, progress=None, state=None):
+        """Embed a stream of chunk texts into the index and chunk store at target.
+
+        Without base a new index and store are built; otherwise the version at
+        base is extended, skipping chunks whose ID is already indexed. The index
+        is created (and trained, for IVF) once enough vectors have been collected,
+        then receives each later batch via add_with_ids. Returns the number of
+        chunks added.
+        """
+        batch_size = batch_size or getattr(settings, "RAG_EMBED_BATCH_SIZE", 64)
+        report = progress or _print_progress
+        state = state or self._new_progress_state(target.docs_path)
+
+        index, index_params, existing_ids = None, {}, None
+        if base is not None:
+            index, index_params, existing_ids = self._writable_index(base)
+        seen = set(existing_ids.tolist()) if existing_ids is not None else set()
+        pending = []  # (embeddings, ids) held back until an IVF index can be trained
+        train_size = training_sample_size(self.index_config)
+
+        with ChunkStoreWriter(target.docs_path, base=base.docs_path if base else None,
+                              existing_ids=existing_ids) as writer:
+            for texts in iter_batches(chunks, batch_size):
+                new_texts, new_ids = [], []
+                for text in texts:
+                    cid = chunk_id(text)
+                    if cid in seen:
+                        state["skipped"] += 1
+                        continue
+                    seen.add(cid)
+                    new_texts.append(text)
+                    new_ids.append(cid)
+                if new_texts:
+                    embeddings = self.encode(new_texts)
+                    ids = np.asarray(new_ids, dtype='int64')
+                    writer.extend(new_texts, ids)
+                    state["chunks"] += len(new_texts)
+                    if index is None:
+                        pending.append((embeddings, ids))
+                        if sum(len(e) for e, _ in pending) >= train_size:
+                            index, index_params = self._start_index(pending)
+                            pending = []
+                    else:
+                        index.add_with_ids(embeddings, ids)
+                report(dict(state))
+
+            if index is None and pending:
+                index, index_params = self._start_index(pending)
+            if index is None:
+                writer.abort()
+                return 0
+
+        # The chunk store was written on close; now the index and its parameters
+        faiss.write_index(index, target.index_path)
+        with open(target.params_path, 'w', encoding='utf-8') as f:
+            json.dump(index_params, f, indent=2)
+        return state["chunks"]
+
+    def _writable_index(self, base):
+        """Read the index at base fully into memory for appending.
+
+        Returns (index, params, ids). Indexes from before chunk IDs existed are
+        rebuilt around an IndexIDMap2 using the content hashes of their chunks.
+        """
+        index = faiss.read_index(base.index_path)
+        params = {"index_type": "flat", "dimension": index.d}
+        if os.path.exists(base.params_path):
+            with open(base.params_path, 'r', encoding='utf-8') as f:
+                params = json.load(f)
+        if isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            apply_search_defaults(index, params)
+            return index, params, index_ids(index)
+
+        store = ChunkStore(base.docs_path)
+        try:
+            ids = np.fromiter((chunk_id(text) for text in store), dtype='int64', count=len(store))
+        finally:
+            store.close()
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        vectors = index.reconstruct_n(0, index.ntotal)
+        empty = faiss.clone_index(index)
+        empty.reset()
+        wrapped = faiss.IndexIDMap2(empty)
+        wrapped.add_with_ids(vectors, ids[:index.ntotal])
+        apply_search_defaults(wrapped, params)
+        print(f"Converted legacy index of {index.ntotal} vectors to content-hash IDs.")
+        return wrapped, params, ids
+
+    def _manifest_key(self, path):
+        return os.path.relpath(path, settings.BASE_DIR)
+
+    def _load_manifest(self, paths):
+        if not os.path.exists(paths.manifest_path):
+            return {}
+        with open(paths.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, paths, manifest):
+        with open(paths.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    def encode(self, texts):
+        """Embed a batch of texts as a contiguous float32 matrix."""
+        return self.encoder.encode(texts)
+
+    def _start_index(self, pending):
+        """Create the configured index from the first batches, training it on them if required."""
+        sample = np.vstack([embeddings for embeddings, _ in pending])
+        ids = np.concatenate([ids for _, ids in pending])
+        index, params = create_index(sample.shape[1], len(sample), self.index_config)
+        params["encoder"] = self.encoder.backend
+        if not index.is_trained:
+            index.train(sample)
+        index.add_with_ids(sample, ids)
+        return index, params
+
+    def search(self, query, k=3, nprobe=None, ef_search=None):
+        """Search for top-k relevant documents for a given query.
+
+        nprobe (IVF indexes) and ef_search (HNSW) override the stored defaults for
+        this call only; higher values improve recall at the cost of latency.
+        """
+        try:
+            return self._search_batch([query], k, nprobe, ef_search)[0]
         except Exception as e:
             raise ValueError(f"Failed to search FAISS index: {e}")
 
+    def search_many(self, queries, k=3, dedupe=True, nprobe=None, ef_search=None):
+        """Search for the top-k documents of several queries in one batch.
+
+        All queries are encoded in a single forward pass and searched with one
+        index.search call on the query matrix. Returns one result list per query,
+        in query order; queries that normalize to the same text are searched once
+        and get the same results. With dedupe, a chunk that matches several
+        queries is kept only in the result set where it is closest, so callers
+        can join the results into one context without repeating text.
+        """
+        try:
+            if not queries:
+                return []
+            keys = [QueryCache.normalize(q) for q in queries]
+            slots, unique = {}, []
+            for query, key in zip(queries, keys):
+                if key not in slots:
+                    slots[key] = len(unique)
+                    unique.append(query)
+            results = self._search_batch(unique, k, nprobe, ef_search)
+            if dedupe:
+                best = {}
+                for qi, hits in enumerate(results):
+                    for doc, dist in hits:
+                        if doc not in best or dist < best[doc][1]:
+                            best[doc] = (qi, dist)
+                results = [[(doc, dist) for doc, dist in hits if best[doc][0] == qi]
+                           for qi, hits in enumerate(results)]
+            # Map every position back to the results of its unique query
+            return [list(results[slots[key]]) for key in keys]
+        except Exception as e:
+            raise ValueError(f"Failed to search FAISS index: {e}")
+
+    def _search_batch(self, queries, k, nprobe=None, ef_search=None):
+        """Return results for each query, from the cache or one batched FAISS search.
+
+        Queries are cached by normalized text, k, search parameters and index
+        version; only the misses are encoded and searched.
+        """
+        version = self.index_version
+        keys = [(QueryCache.normalize(q), k, nprobe, ef_search, version) for q in queries]
+        results = [self.query_cache.get(key) for key in keys]
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if missing:
+            fresh = self._search_index([queries[i] for i in missing], k, nprobe, ef_search)
+            for i, hits in zip(missing, fresh):
+                self.query_cache.put(keys[i], hits)
+                results[i] = hits
+        return [list(hits) for hits in results]
+
+    def _search_index(self, queries, k, nprobe=None, ef_search=None):
+        """Encode queries together and run a single FAISS search over them."""
+        # One snapshot reference, so a concurrent swap cannot mix index and chunks
+        snapshot = self._snapshot
+        index, documents = snapshot.index, snapshot.documents
+        if index is None or not documents:
+            raise ValueError("FAISS index or documents not initialized. Call load_pdf_and_embed first.")
+
+        query_embeddings = self.encode(queries)
+        params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+        distances, indices = index.search(query_embeddings, k, params=params)
+
+        # Retrieve matching documents by chunk ID
+        results = []
+        for row in range(len(queries)):
+            hits = []
+            for i, idx in enumerate(indices[row]):
+                if idx < 0:
+                    continue
+                doc = documents.get_by_id(int(idx))
+                if doc is not None:
+                    hits.append((doc, float(distances[row][i])))
+            results.append(tuple(hits))
+        return results
+
+def _current_rss_bytes():
+    """Return the resident set size of this process in bytes, or None if unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak RSS: kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, ValueError):
+        return None
+
+# Process-wide RAG registry: one FAISSRAG per worker process, shared by all requests
+_rag_instance = None
+_rag_lock = threading.Lock()
+_rag_stats = {
+    "loads": 0,
+    "last_load_seconds": None,
+    "total_load_seconds": 0.0,
+    "rss_before_load": None,
+    "rss_after_load": None,
+    "loaded_at": None,
+    "pid": None,
+}
+
+def _build_rag():
+    """Create a FAISSRAG instance and record how long and how much memory it took."""
+    rss_before = _current_rss_bytes()
+    started = time.perf_counter()
+    rag = FAISSRAG()
+    elapsed = time.perf_counter() - started
+    _rag_stats["loads"] += 1
+    _rag_stats["last_load_seconds"] = elapsed
+    _rag_stats["total_load_seconds"] += elapsed
+    _rag_stats["rss_before_load"] = rss_before
+    _rag_stats["rss_after_load"] = _current_rss_bytes()
+    _rag_stats["loaded_at"] = time.time()
+    _rag_stats["pid"] = os.getpid()
+    print(f"Loaded shared FAISSRAG in {elapsed:.2f}s (pid {os.getpid()}).")
+    return rag
+
+def get_rag():
+    """Return the shared FAISSRAG instance, loading the model and index on first use.
+
+    Also checks, at most every RAG_RELOAD_CHECK_SECONDS, whether another process
+    has published a newer index version and if so reloads it in the background.
+    """
+    global _rag_instance
+    rag = _rag_instance
+    if rag is None:
+        with _rag_lock:
+            if _rag_instance is None:
+                try:
+                    _rag_instance = _build_rag()
+                except Exception as e:
+                    raise ValueError(f"Failed to initialize shared RAG: {e}")
+            rag = _rag_instance
+    _maybe_schedule_refresh(rag)
+    return rag
+
+_shared_encoder = None
+
+def get_shared_encoder():
+    """Return the sentence encoder of the shared RAG if it is loaded, else a standalone one.
+
+    For callers that only embed text (skill matching), so they do not load
+    the FAISS index and chunk store.
+    """
+    global _shared_encoder
+    rag = _rag_instance
+    if rag is not None:
+        return rag.encoder
+    with _rag_lock:
+        if _rag_instance is not None:
+            return _rag_instance.encoder
+        if _shared_encoder is None:
+            _shared_encoder = get_encoder()
+        return _shared_encoder
+
+def reload_rag():
+    """Reload the index and documents from disk into the shared instance.
+
+    The embedding model is kept; only the index and chunk texts are re-read. If no
+    instance exists yet, one is created.
+    """
+    global _rag_instance
+    with _rag_lock:
+        try:
+            if _rag_instance is None:
+                _rag_instance = _build_rag()
+            else:
+                started = time.perf_counter()
+                _rag_instance.load_index_and_documents()
+                _rag_stats["last_reload_seconds"] = time.perf_counter() - started
+                _rag_stats["reloads"] = _rag_stats.get("reloads", 0) + 1
+            return _rag_instance
+        except Exception as e:
+            raise ValueError(f"Failed to reload shared RAG: {e}")
+
+# Background index builds: one worker thread per process, one build at a time
+_build_lock = threading.Lock()
+_build_executor = None
+_build_executor_pid = None
+_build_future = None
+_build_status = {"state": "idle", "source": None, "started_at": None, "finished_at": None, "error": None}
+_last_refresh_check = 0.0
+
+def _get_build_executor():
+    """Return this process's build executor; threads do not survive a fork."""
+    global _build_executor, _build_executor_pid
+    if _build_executor is None or _build_executor_pid != os.getpid():
+        _build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rag-build')
+        _build_executor_pid = os.getpid()
+    return _build_executor
+
+def _run_build(pdf_path, directory):
+    _build_status.update(state="running", source=directory or pdf_path,
+                         started_at=time.time(), finished_at=None, error=None)
+    try:
+        rag = get_rag()
+        if directory:
+            rag.ingest_directory(directory)
+        else:
+            rag.load_pdf_and_embed(pdf_path)
+        _build_status.update(state="done", finished_at=time.time())
+    except Exception as e:
+        _build_status.update(state="failed", finished_at=time.time(), error=str(e))
+        print(f"Warning: Background index build failed: {e}")
+        raise
+
+def rebuild_index_async(pdf_path=None, directory=None, force=False):
+    """Build a new index version in the background and hot-swap it in when done.
+
+    Builds from the PDF at pdf_path (default settings.RAG_PLAYBOOK_PDF) or, with
+    directory, ingests that directory incrementally. Returns a Future. While a
+    build is running in this process, further calls return the running build's
+    Future instead of starting another. After a failed build, calls within
+    RAG_REBUILD_RETRY_SECONDS return the failed build's Future unless force.
+    """
+    global _build_future
+    with _build_lock:
+        if _build_future is not None and not _build_future.done():
+            return _build_future
+        retry_after = getattr(settings, "RAG_REBUILD_RETRY_SECONDS", 300)
+        if (not force and _build_future is not None and _build_status["state"] == "failed"
+                and time.time() - (_build_status["finished_at"] or 0) < retry_after):
+            return _build_future
+        if not directory and not pdf_path:
+            pdf_path = getattr(settings, "RAG_PLAYBOOK_PDF",
+                               'data/08.031.17-Agile-Playbook-2.1-v12-One-Per-Student.pdf')
+        _build_future = _get_build_executor().submit(_run_build, pdf_path, directory)
+        return _build_future
+
+def index_build_status():
+    """Return the state of this process's most recent background build."""
+    with _build_lock:
+        status = dict(_build_status)
+        status["running"] = _build_future is not None and not _build_future.done()
+    return status
+
+def _refresh(rag):
+    if rag.is_stale():
+        reload_rag()
+
+def _maybe_schedule_refresh(rag):
+    """Reload in the background if another process published a newer index version."""
+    global _last_refresh_check
+    interval = getattr(settings, "RAG_RELOAD_CHECK_SECONDS", 5)
+    now = time.monotonic()
+    if now - _last_refresh_check < interval:
+        return
+    _last_refresh_check = now
+    try:
+        if rag.is_stale():
+            with _build_lock:
+                if _build_future is None or _build_future.done():
+                    _get_build_executor().submit(_refresh, rag)
+    except OSError as e:
+        print(f"Warning: Failed to check for a newer RAG index: {e}")
+
+def get_rag_stats():
+    """Return load-time and memory statistics for the shared RAG instance."""
+    with _rag_lock:
+        stats = dict(_rag_stats)
+        stats["initialized"] = _rag_instance is not None
+        stats["documents"] = len(_rag_instance.documents) if _rag_instance is not None else 0
+        if _rag_instance is not None:
+            stats["index_version"] = _rag_instance.index_version
+            stats["store_dir"] = _rag_instance.store_dir
+            stats["query_cache"] = _rag_instance.query_cache.stats()
+    stats["build"] = index_build_status()
+    stats["rss_now"] = _current_rss_bytes()
+    if stats["rss_before_load"] is not None and stats["rss_after_load"] is not None:
+        stats["rss_load_delta"] = stats["rss_after_load"] - stats["rss_before_load"]
+    return stats
+
 if __name__ == "__main__":
     # Initialize RAG and process the Agile playbook PDF
     try:
         rag = FAISSRAG()
-        pdf_path = 'data/08.031.17-Agile-Playbook-2.1-v12-One-Per-Student.pdf'
+        pdf_path = getattr(settings, "RAG_PLAYBOOK_PDF", 'data/08.031.17-Agile-Playbook-2.1-v12-One-Per-Student.pdf')
         rag.load_pdf_and_embed(pdf_path)
         # Test retrieval
         query = "How to extract features in Agile methodology?"
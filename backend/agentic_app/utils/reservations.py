@@ -0,0 +1,82 @@
+import os
+import sys
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from agentic_app.utils.db import get_db
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Atomic developer reservation. A developer is claimed with a conditional
+# find_one_and_update that only matches while task_allocated is not True (so
+# documents that never had the field count as free, as in free_developer_ids)
+# or the developer is already held by the same project, so of several matchers
+# racing for the same developer exactly one wins; the others see None and
+# re-solve without that developer.
+
+def _developer_filter(developer_id):
+    try:
+        return {"_id": ObjectId(developer_id)}
+    except (InvalidId, TypeError):
+        # Index entries of documents without an _id are keyed by name
+        return {"name": developer_id}
+
+def reserve_developer(developer_id, project_id, collection=None):
+    """Atomically claim a developer for project_id; returns True if it is now held by project_id.
+
+    A developer already held by project_id is claimed again (keeping it held).
+    """
+    if collection is None:
+        collection = get_db()["developers"]
+    claimed = collection.find_one_and_update(
+        dict(_developer_filter(developer_id),
+             **{"$or": [{"task_allocated": {"$ne": True}}, {"allocated_project": project_id}]}),
+        {"$set": {"task_allocated": True, "allocated_project": project_id, "allocated_at": datetime.now()}},
+        projection={"_id": 1},
+    )
+    return claimed is not None
+
+def reserve_developers(developer_ids, project_id, collection=None):
+    """Try to claim each developer once; returns (reserved, conflicts) lists of IDs."""
+    reserved, conflicts = [], []
+    for developer_id in dict.fromkeys(developer_ids):
+        if reserve_developer(developer_id, project_id, collection):
+            reserved.append(developer_id)
+        else:
+            conflicts.append(developer_id)
+    return reserved, conflicts
+
+def release_developers(developer_ids, project_id, collection=None):
+    """Free developers held by project_id; developers since claimed by others are untouched."""
+    if collection is None:
+        collection = get_db()["developers"]
+    developer_ids = list(dict.fromkeys(developer_ids))
+    if not developer_ids:
+        return 0
+    result = collection.update_many(
+        {"$or": [_developer_filter(d) for d in developer_ids], "allocated_project": project_id},
+        {"$set": {"task_allocated": False}, "$unset": {"allocated_project": "", "allocated_at": ""}},
+    )
+    return result.modified_count
+
+def free_developer_ids(developer_ids, collection=None):
+    """The subset of developer_ids not currently reserved, read from MongoDB."""
+    if collection is None:
+        collection = get_db()["developers"]
+    developer_ids = list(dict.fromkeys(str(d) for d in developer_ids))
+    if not developer_ids:
+        return []
+    object_ids, names = [], []
+    for developer_id in developer_ids:
+        key = _developer_filter(developer_id)
+        (object_ids if "_id" in key else names).append(key.get("_id", key.get("name")))
+    free = set()
+    for doc in collection.find(
+        {"$or": [{"_id": {"$in": object_ids}}, {"name": {"$in": names}}], "task_allocated": {"$ne": True}},
+        {"_id": 1, "name": 1},
+    ):
+        free.add(str(doc["_id"]) if str(doc["_id"]) in developer_ids else doc.get("name"))
+    return [d for d in developer_ids if d in free]
@@ -0,0 +1,193 @@
+import os
+import sys
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from agentic_app.utils.db import get_db
+from agentic_app.utils.team_prompt import normalize_skill
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Fields of a developer document the index keeps; everything else (password
+# hashes, emails, timestamps) stays in MongoDB.
+INDEX_FIELDS = {"_id": 1, "name": 1, "skills": 1, "bandwidth": 1, "past_performance_score": 1, "task_allocated": 1}
+
+class DeveloperIndex:
+    """In-memory index of the developers collection for skill filtering.
+
+    Normalized skill names map to integer skill IDs, and each developer is a
+    row of a boolean developers x skills matrix, next to NumPy columns of
+    bandwidth, performance and availability. A query such as "skills X and Y
+    with bandwidth >= b" is then a vectorized AND over a few matrix columns.
+    Rows and skill columns are added in place (with capacity doubling), so
+    signups and profile updates are applied without a reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.skill_ids = {}
+        self.keys = []
+        self.slots = {}
+        self.docs = []
+        self._skills = np.zeros((0, 0), dtype=bool)
+        self._bandwidth = np.zeros(0, dtype=np.float32)
+        self._performance = np.zeros(0, dtype=np.float32)
+        self._available = np.zeros(0, dtype=bool)
+        self._alive = np.zeros(0, dtype=bool)
+        self.loaded_at = None
+        self.reloading = False
+
+    def __len__(self):
+        with self._lock:
+            return int(self._alive[:len(self.keys)].sum())
+
+    @staticmethod
+    def key_for(doc):
+        return str(doc.get("_id") or doc.get("name"))
+
+    def _ensure_capacity(self, rows, columns):
+        """Grow the arrays to hold at least rows developers and columns skills."""
+        have_rows, have_columns = self._skills.shape
+        if rows <= have_rows and columns <= have_columns:
+            return
+        new_rows = max(rows, have_rows * 2 if rows > have_rows else have_rows, 16)
+        new_columns = max(columns, have_columns * 2 if columns > have_columns else have_columns, 16)
+        skills = np.zeros((new_rows, new_columns), dtype=bool)
+        skills[:have_rows, :have_columns] = self._skills
+        self._skills = skills
+        for name in ("_bandwidth", "_performance", "_available", "_alive"):
+            old = getattr(self, name)
+            grown = np.zeros(new_rows, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _skill_id(self, skill):
+        skill_id = self.skill_ids.get(skill)
+        if skill_id is None:
+            skill_id = self.skill_ids[skill] = len(self.skill_ids)
+            self._ensure_capacity(len(self.keys), len(self.skill_ids))
+        return skill_id
+
+    def upsert(self, doc):
+        """Add or replace one developer document."""
+        key = self.key_for(doc)
+        skills = {normalize_skill(s) for s in doc.get("skills", []) if normalize_skill(s)}
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slots[key] = len(self.keys)
+                self.keys.append(key)
+                self.docs.append(None)
+                self._ensure_capacity(len(self.keys), len(self.skill_ids))
+            skill_ids = [self._skill_id(s) for s in skills]
+            self._skills[slot, :] = False
+            self._skills[slot, skill_ids] = True
+            self._bandwidth[slot] = float(doc.get("bandwidth") or 0.0)
+            self._performance[slot] = float(doc.get("past_performance_score") or 0.0)
+            self._available[slot] = not doc.get("task_allocated", False)
+            self._alive[slot] = True
+            self.docs[slot] = {
+                "developer_id": key,
+                "name": doc.get("name", ""),
+                "skills": list(doc.get("skills", [])),
+                "bandwidth": float(doc.get("bandwidth") or 0.0),
+                "past_performance_score": float(doc.get("past_performance_score") or 0.0),
+            }
+
+    def remove(self, key):
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is not None:
+                self._alive[slot] = False
+
+    def set_allocated(self, developer_ids, allocated=True):
+        """Mark developers (by developer_id) allocated or free."""
+        with self._lock:
+            for key in developer_ids:
+                slot = self.slots.get(str(key))
+                if slot is not None:
+                    self._available[slot] = not allocated
+
+    def load(self, collection=None):
+        """Rebuild the index from the developers collection."""
+        if collection is None:
+            collection = get_db()["developers"]
+        fresh = DeveloperIndex()
+        for doc in collection.find({}, INDEX_FIELDS):
+            fresh.upsert(doc)
+        with self._lock:
+            self.skill_ids, self.keys, self.slots, self.docs = fresh.skill_ids, fresh.keys, fresh.slots, fresh.docs
+            self._skills, self._bandwidth, self._performance = fresh._skills, fresh._bandwidth, fresh._performance
+            self._available, self._alive = fresh._available, fresh._alive
+            self.loaded_at = time.time()
+        return self
+
+    def query_slots(self, skills=(), min_bandwidth=0.0, available_only=True):
+        """Slots of developers having all skills and at least min_bandwidth."""
+        with self._lock:
+            n = len(self.keys)
+            mask = self._alive[:n].copy()
+            if available_only:
+                mask &= self._available[:n]
+            if min_bandwidth:
+                mask &= self._bandwidth[:n] >= min_bandwidth
+            for skill in skills:
+                skill_id = self.skill_ids.get(normalize_skill(skill))
+                if skill_id is None:
+                    return np.zeros(0, dtype=np.int64)
+                mask &= self._skills[:n, skill_id]
+            return np.flatnonzero(mask)
+
+    def query(self, skills=(), min_bandwidth=0.0, available_only=True):
+        """Developers having all skills (normalized) with bandwidth >= min_bandwidth.
+
+        Returns plain dicts with developer_id, name, skills, bandwidth and
+        past_performance_score.
+        """
+        slots = self.query_slots(skills, min_bandwidth, available_only)
+        with self._lock:
+            return [dict(self.docs[slot]) for slot in slots]
+
+    def stats(self):
+        with self._lock:
+            n = len(self.keys)
+            return {
+                "developers": int(self._alive[:n].sum()),
+                "available": int((self._alive[:n] & self._available[:n]).sum()),
+                "skills": len(self.skill_ids),
+                "loaded_at": self.loaded_at,
+            }
+
+_developer_index = None
+_index_lock = threading.Lock()
+
+def get_developer_index():
+    """Return the process-wide developer index, loading it on first use.
+
+    Updates made through this process are applied incrementally; the index is
+    also reloaded every SKILL_INDEX_REFRESH_SECONDS to pick up profile changes
+    made by other processes. The caller that finds the index stale reloads
+    it while other callers keep using the current contents.
+    """
+    global _developer_index
+    refresh = getattr(settings, "SKILL_INDEX_REFRESH_SECONDS", 300)
+    with _index_lock:
+        if _developer_index is None:
+            _developer_index = DeveloperIndex().load()
+            return _developer_index
+        index = _developer_index
+        stale = bool(refresh) and time.time() - (index.loaded_at or 0) > refresh and not index.reloading
+        if stale:
+            index.reloading = True
+    if stale:
+        try:
+            index.load()
+        except Exception as e:
+            print(f"Warning: Failed to reload the developer index: {e}")
+        finally:
+            index.reloading = False
+    return index
@@ -0,0 +1,170 @@
+import os
+import sys
+import re
+import json
+import xxhash
+from django.conf import settings
+from agentic_app.utils.llm import count_tokens
+
+# Ensure the backend directory is in the Python path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Compact, token-budgeted prompts for the team matcher. Only the fields the
+# allocation needs are serialized, without indentation, and each story lists
+# a bounded shortlist of candidate developers instead of the whole pool.
+
+TEAM_MATCHER_INSTRUCTIONS = """You are an AI allocation assistant.
+Allocate each user story to the best-suited developer from its candidates.
+Criteria:
+- Match skills in story with developer skills.
+- Prefer developers with higher perf (past_performance_score).
+- Ensure fair distribution based on bw (bandwidth).
+
+Output ONLY in this JSON format:
+{"allocations":[{"story_title":"","assigned_to":"","reason":""}]}
+"""
+
+STORY_TEXT_CHARS = 400
+WORD_RE = re.compile(r"[a-z0-9+#.]+")
+
+def normalize_skill(skill):
+    """Canonical form of a skill name for matching: lowercase, single-spaced."""
+    return " ".join(str(skill).lower().split())
+
+def story_text(story):
+    """Title and Gherkin text of a user story, as one string."""
+    return f"{story.get('title', '')}\n{story.get('gherkin', '')}"
+
+def story_hash(story):
+    """Content hash of a user story's title and Gherkin text."""
+    return xxhash.xxh3_64_hexdigest(story_text(story).encode("utf-8"))
+
+def compact_story(story):
+    return {"title": story.get("title", ""), "text": " ".join(story.get("gherkin", "").split())[:STORY_TEXT_CHARS]}
+
+def compact_developer(developer):
+    return {
+        "name": developer.get("name", ""),
+        "skills": developer.get("skills", []),
+        "perf": round(float(developer.get("past_performance_score") or 0.0), 2),
+        "bw": round(float(developer.get("bandwidth") or 0.0), 2),
+    }
+
+def skill_matches(story, skills):
+    """Number of skills whose words all occur in the story's text."""
+    words = set(WORD_RE.findall(story_text(story).lower()))
+    matches = 0
+    for skill in skills:
+        terms = set(WORD_RE.findall(normalize_skill(skill)))
+        if terms and terms <= words:
+            matches += 1
+    return matches
+
+def shortlist_developers(story, developers, size):
+    """The size best candidates for story, by skill overlap, then performance and bandwidth."""
+    def score(developer):
+        return (
+            skill_matches(story, developer.get("skills", [])),
+            float(developer.get("past_performance_score") or 0.0),
+            float(developer.get("bandwidth") or 0.0),
+        )
+    return sorted(developers, key=score, reverse=True)[:size]
+
+def render_prompt(stories, shortlists):
+    """Render the prompt for stories, each with its shortlist of developers."""
+    developers = {}
+    for shortlist in shortlists:
+        for developer in shortlist:
+            developers.setdefault(developer.get("name", ""), compact_developer(developer))
+    story_rows = [
+        dict(compact_story(story), candidates=[d.get("name", "") for d in shortlist])
+        for story, shortlist in zip(stories, shortlists)
+    ]
+    compact = (",", ":")
+    return (
+        TEAM_MATCHER_INSTRUCTIONS
+        + "\nUser Stories:\n" + json.dumps(story_rows, separators=compact, ensure_ascii=False)
+        + "\n\nDevelopers:\n" + json.dumps(list(developers.values()), separators=compact, ensure_ascii=False)
+        + "\n"
+    )
+
+def build_team_matcher_prompt(stories, developers, max_tokens=None, shortlist_size=None):
+    """Build the largest prompt for a prefix of stories that fits in max_tokens.
+
+    Returns (prompt, token_count, story_count). If not even one story fits,
+    the shortlist is halved (down to one candidate) before giving up with a
+    ValueError. Callers send the prompt and build the next one for the
+    remaining stories.
+    """
+    if max_tokens is None:
+        max_tokens = getattr(settings, "TEAM_MATCHER_PROMPT_TOKEN_BUDGET", 6000)
+    if shortlist_size is None:
+        shortlist_size = getattr(settings, "TEAM_MATCHER_SHORTLIST_SIZE", 8)
+    if not stories:
+        raise ValueError("No user stories to build a prompt for")
+
+    while True:
+        shortlists = [shortlist_developers(story, developers, shortlist_size) for story in stories]
+        best = None
+        # Binary search for the longest prefix of stories within budget
+        low, high = 1, len(stories)
+        while low <= high:
+            mid = (low + high) // 2
+            prompt = render_prompt(stories[:mid], shortlists[:mid])
+            tokens = count_tokens(prompt)
+            if tokens <= max_tokens:
+                best = (prompt, tokens, mid)
+                low = mid + 1
+            else:
+                high = mid - 1
+        if best is not None:
+            return best
+        if shortlist_size <= 1:
+            raise ValueError(f"A single user story does not fit in the {max_tokens}-token prompt budget")
+        shortlist_size //= 2
+
+REASONS_INSTRUCTIONS = """You are an AI allocation assistant.
+Each user story below has already been assigned to a developer.
+Write a one-sentence, human-readable reason for each assignment, based on the
+matched skills, perf (past_performance_score) and bw (bandwidth).
+
+Output ONLY in this JSON format:
+{"reasons":[{"story_title":"","reason":""}]}
+"""
+
+def build_reasons_prompts(allocations, developers, max_tokens=None):
+    """Split fixed allocations into prompts asking only for their reason text.
+
+    Returns a list of (prompt, token_count) pairs, each within max_tokens.
+    """
+    if max_tokens is None:
+        max_tokens = getattr(settings, "TEAM_MATCHER_PROMPT_TOKEN_BUDGET", 6000)
+    by_name = {d.get("name", ""): compact_developer(d) for d in developers}
+    compact = (",", ":")
+    budget = max_tokens - count_tokens(REASONS_INSTRUCTIONS) - 16
+    prompts, rows, used = [], [], 0
+    for allocation in allocations:
+        developer = by_name.get(allocation.get("assigned_to"), {})
+        row = json.dumps({
+            "story_title": allocation.get("story_title", ""),
+            "assigned_to": allocation.get("assigned_to", ""),
+            "matched_skills": allocation.get("matched_skills", []),
+            "perf": developer.get("perf", 0.0),
+            "bw": developer.get("bw", 0.0),
+        }, separators=compact, ensure_ascii=False)
+        row_tokens = count_tokens(row) + 1
+        if rows and used + row_tokens > budget:
+            prompts.append(rows)
+            rows, used = [], 0
+        rows.append(row)
+        used += row_tokens
+    if rows:
+        prompts.append(rows)
+
+    rendered = []
+    for rows in prompts:
+        prompt = REASONS_INSTRUCTIONS + "\nAllocations:\n[" + ",".join(rows) + "]\n"
+        rendered.append((prompt, count_tokens(prompt)))
+    return rendered
@@ -1,16 +1,22 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
+from django.urls import reverse
 from functools import wraps
 import json
 import jwt
 import datetime
-from agentic_app.agents.idea_agent import process_idea  
-from agentic_app.agents.epic_agent import generate_epics_and_stories
+from agentic_app.agents.idea_agent import process_idea, stream_process_idea
+from agentic_app.agents.epic_agent import generate_epics_and_stories, stream_epics_and_stories
 from agentic_app.agents.team_matcher_agent import match_team_and_allocate
-from agentic_app.utils.db import get_mongo_client, get_project_data, get_all_developers
-from pymongo import MongoClient
+from agentic_app.agents.jobs import start_local_workers, get_local_worker_stats
+from agentic_app.utils.db import get_db, get_project_data, get_all_developers, ping_mongo
+from agentic_app.utils.rag import get_rag_stats
+from agentic_app.utils.llm import get_llm_metrics
+from agentic_app.utils.skill_index import get_developer_index, INDEX_FIELDS
+from agentic_app.utils.jobs import enqueue_job, get_job, cancel_job, job_summary, job_timeout, queue_metrics
+from pymongo import ReturnDocument
 from bson import ObjectId
 from django.contrib.auth.hashers import make_password, check_password
 import re
@@ -20,12 +26,8 @@ from django.conf import settings
 SECRET_KEY = settings.SECRET_KEY
 JWT_ALGORITHM = "HS256"
 
-# Initialize MongoDB client using db.py
-client = get_mongo_client()
-db = client[settings.MONGO_DB_NAME]
-developers_collection = db["developers"]
-managers_collection = db["managers"]
-project_analysis_collection = db["project_analysis"]
+# Collections are looked up per request through get_db(), so each process
+# uses its own pooled client (see db.py)
 
 # JWT Token Verification Decorator
 def jwt_required(f):
@@ -51,6 +53,36 @@ def jwt_required(f):
         return f(request, *args, **kwargs)
     return decorated
 
+def cache_bypassed(request):
+    """True if the client asked for a fresh LLM response instead of a cached one."""
+    if request.headers.get('X-Cache-Bypass', '').strip().lower() in ('1', 'true', 'yes'):
+        return True
+    return 'no-cache' in request.headers.get('Cache-Control', '').lower()
+
+def prefers_async(request):
+    """True if the client sent Prefer: respond-async and wants a job ID instead of waiting."""
+    preferences = request.headers.get('Prefer', '').split(',')
+    return any(p.split(';')[0].strip().lower() == 'respond-async' for p in preferences)
+
+def job_accepted_response(kind, payload, data):
+    """Queue a job and answer 202 Accepted with its ID and status URL.
+
+    The job runs on this process's local job threads (JOBS_LOCAL_WORKERS) or
+    on any `manage.py run_job_worker`; data may set "timeout_seconds".
+    An invalid timeout is answered with 400 and nothing is queued.
+    """
+    try:
+        timeout = job_timeout(data.get('timeout_seconds'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    job = enqueue_job(kind, payload, timeout=timeout)
+    start_local_workers()
+    status_url = reverse('job_status_endpoint', args=[job['_id']])
+    response = JsonResponse({"status": "accepted", "job_id": job['_id'], "status_url": status_url}, status=202)
+    response['Location'] = status_url
+    response['Preference-Applied'] = 'respond-async'
+    return response
+
 # New endpoint to save edited analysis
 @csrf_exempt
 @jwt_required
@@ -69,7 +101,7 @@ def save_analysis(request):
             return JsonResponse({'error': 'Missing project_id or analysis'}, status=400)
 
         # Save or update the analysis
-        project_analysis_collection.update_one(
+        get_db()['project_analysis'].update_one(
             {'project_id': project_id},
             {'$set': {'analysis': analysis, 'updated_at': datetime.datetime.now()}},
             upsert=True
@@ -90,7 +122,7 @@ def get_all_developers_endpoint(request):
         if request.user_type != 'manager':
             return JsonResponse({'error': 'Unauthorized: Not a manager'}, status=403)
         
-        developers = list(developers_collection.find(
+        developers = list(get_db()['developers'].find(
             {},
             {'_id': 1, 'name': 1, 'role': 1, 'skills': 1, 'bandwidth': 1, 'work_batch': 1}
         ))
@@ -121,7 +153,13 @@ def process_idea_endpoint(request):
         if not project_id or not idea or not team_metadata:
             return JsonResponse({'error': 'Missing project_id, idea, or team_metadata'}, status=400)
 
-        analysis = process_idea(project_id, idea, team_metadata)
+        if prefers_async(request):
+            return job_accepted_response('process_idea', {
+                'project_id': project_id, 'idea': idea, 'team_metadata': team_metadata,
+                'use_cache': not cache_bypassed(request),
+            }, data)
+
+        analysis = process_idea(project_id, idea, team_metadata, use_cache=not cache_bypassed(request))
         return JsonResponse({'status': 'success', 'analysis': analysis}, status=200)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
@@ -146,25 +184,82 @@ def generate_epics_endpoint(request):
             return JsonResponse({"error": "No analysis data found for project_id"}, status=404)
         
         features = project_data['analysis'].get('features', [])
-        epics_stories = generate_epics_and_stories(features, project_id)
+        if prefers_async(request):
+            return job_accepted_response('generate_epics', {
+                'project_id': project_id, 'features': features, 'use_cache': not cache_bypassed(request),
+            }, data)
+
+        epics_stories = generate_epics_and_stories(features, project_id, use_cache=not cache_bypassed(request))
         return JsonResponse({"status": "success", "epics_stories": epics_stories}, status=200)
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON format"}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-def serialize_allocations(allocations):
-    """Convert datetime fields in allocations to strings."""
-    serialized = []
-    for allocation in allocations:
-        serialized_allocation = {}
-        for key, value in allocation.items():
-            if isinstance(value, datetime):
-                serialized_allocation[key] = value.isoformat()  # Convert datetime to ISO 8601 string
-            else:
-                serialized_allocation[key] = value
-        serialized.append(serialized_allocation)
-    return serialized
+def sse_response(events, result_key):
+    """Stream (event, data) pairs from an agent as Server-Sent Events.
+
+    Token events carry {"text": ...}; the final result event carries
+    {"status": "success", result_key: ...}. Failures after the stream has
+    started are sent as an error event, since the status code is already out.
+    """
+    def stream():
+        try:
+            for event, data in events:
+                if event == "result":
+                    payload = {"status": "success", result_key: data}
+                else:
+                    payload = {"text": data}
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+@require_POST
+def process_idea_stream_endpoint(request):
+    """Streaming variant of process_idea_endpoint over Server-Sent Events."""
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
+    project_id = data.get('project_id')
+    idea = data.get('idea')
+    team_metadata = data.get('team_metadata')
+
+    if not project_id or not idea or not team_metadata:
+        return JsonResponse({'error': 'Missing project_id, idea, or team_metadata'}, status=400)
+
+    events = stream_process_idea(project_id, idea, team_metadata, use_cache=not cache_bypassed(request))
+    return sse_response(events, 'analysis')
+
+@csrf_exempt
+@require_POST
+def generate_epics_stream_endpoint(request):
+    """Streaming variant of generate_epics_endpoint over Server-Sent Events."""
+    try:
+        data = json.loads(request.body)
+        project_id = data.get('project_id')
+
+        if not project_id:
+            return JsonResponse({"error": "Missing project_id"}, status=400)
+
+        project_data = get_project_data(project_id)
+        if not project_data or 'analysis' not in project_data:
+            return JsonResponse({"error": "No analysis data found for project_id"}, status=404)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    features = project_data['analysis'].get('features', [])
+    events = stream_epics_and_stories(features, project_id, use_cache=not cache_bypassed(request))
+    return sse_response(events, 'epics_stories')
 
 @csrf_exempt
 def team_matcher_endpoint(request):
@@ -183,15 +278,24 @@ def team_matcher_endpoint(request):
         if not project_id:
             return JsonResponse({"error": "Missing project_id"}, status=400)
         
-        # Call the team matching function
-        allocations = match_team_and_allocate(project_id)
-        
-        # Serialize allocations to handle datetime objects
-        serialized_allocations = serialize_allocations(allocations)
+        if prefers_async(request):
+            return job_accepted_response('team_matcher', {
+                'project_id': project_id, 'use_cache': not cache_bypassed(request),
+                'incremental': not data.get("full", False),
+            }, data)
+
+        # Call the team matching function; "full": true re-allocates every story
+        allocations = match_team_and_allocate(
+            project_id,
+            use_cache=not cache_bypassed(request),
+            incremental=not data.get("full", False)
+        )
         
+        # JsonResponse encodes any datetime values itself
         return JsonResponse({
             "project_id": project_id,
-            "allocations": serialized_allocations
+            "allocations": allocations.get("allocations", []),
+            "unassigned": allocations.get("unassigned", [])
         }, status=200)
     except Exception as e:
         return JsonResponse({"error": f"Failed in Team Matcher Agent: {str(e)}"}, status=500)
@@ -205,6 +309,70 @@ def get_developers_endpoint(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+@csrf_exempt
+@require_GET
+def db_health_endpoint(request):
+    """Ping MongoDB through the shared client pool."""
+    health = ping_mongo()
+    return JsonResponse(health, status=200 if health["ok"] else 503)
+
+@csrf_exempt
+@jwt_required
+@require_GET
+def rag_stats_endpoint(request):
+    """Report load-time and memory stats of this worker's shared RAG instance."""
+    try:
+        return JsonResponse({"status": "success", "rag": get_rag_stats()}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@jwt_required
+@require_GET
+def llm_metrics_endpoint(request):
+    """Report this worker's Gemini client setup, queueing and inference metrics."""
+    try:
+        return JsonResponse({"status": "success", "llm": get_llm_metrics()}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_GET
+def job_status_endpoint(request, job_id):
+    """Poll a job queued with Prefer: respond-async; includes the result once it succeeded."""
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return JsonResponse({"error": "Job not found"}, status=404)
+        # Jobs left queued by a restarted process resume once a worker runs here
+        start_local_workers()
+        return JsonResponse({"status": "success", "job": job_summary(job)}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_POST
+def cancel_job_endpoint(request, job_id):
+    """Cancel a queued or running job."""
+    try:
+        job = cancel_job(job_id)
+        if job is None:
+            return JsonResponse({"error": "Job not found"}, status=404)
+        return JsonResponse({"status": "success", "job": job_summary(job)}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@jwt_required
+@require_GET
+def job_metrics_endpoint(request):
+    """Report queue depth and job counts, and this worker process's job threads."""
+    try:
+        return JsonResponse({"status": "success", "queue": queue_metrics(),
+                             "local_worker": get_local_worker_stats()}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
 @csrf_exempt
 @require_POST
 def developer_signup(request):
@@ -236,7 +404,7 @@ def developer_signup(request):
         if work_batch not in ['8-6', '9-5']:
             return JsonResponse({'error': 'Work batch must be either "8-6" or "9-5"'}, status=400)
         
-        if developers_collection.find_one({'email': email}):
+        if get_db()['developers'].find_one({'email': email}):
             return JsonResponse({'error': 'Email already registered'}, status=400)
         
         bandwidth = hours_per_day / 10.0
@@ -254,7 +422,8 @@ def developer_signup(request):
             'work_batch': work_batch,
             'created_at': datetime.datetime.now()
         }
-        result = developers_collection.insert_one(developer_data)
+        result = get_db()['developers'].insert_one(developer_data)
+        get_developer_index().upsert(developer_data)
         
         return JsonResponse({
             'status': 'success',
@@ -279,7 +448,7 @@ def developer_login(request):
         if not email or not password:
             return JsonResponse({'error': 'Missing email or password'}, status=400)
         
-        developer = developers_collection.find_one({'email': email})
+        developer = get_db()['developers'].find_one({'email': email})
         if not developer:
             return JsonResponse({'error': 'Invalid email or password'}, status=401)
         
@@ -327,7 +496,7 @@ def manager_signup(request):
         if len(password) < 8 or not re.search(r"[0-9]", password) or not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
             return JsonResponse({'error': 'Password must be at least 8 characters long and contain at least one number and one special character'}, status=400)
         
-        if managers_collection.find_one({'email': email}):
+        if get_db()['managers'].find_one({'email': email}):
             return JsonResponse({'error': 'Email already registered'}, status=400)
         
         hashed_password = make_password(password)
@@ -338,7 +507,7 @@ def manager_signup(request):
             'department': department or '',
             'created_at': datetime.datetime.now()
         }
-        result = managers_collection.insert_one(manager_data)
+        result = get_db()['managers'].insert_one(manager_data)
         
         return JsonResponse({
             'status': 'success',
@@ -363,7 +532,7 @@ def manager_login(request):
         if not email or not password:
             return JsonResponse({'error': 'Missing email or password'}, status=400)
         
-        manager = managers_collection.find_one({'email': email})
+        manager = get_db()['managers'].find_one({'email': email})
         if not manager:
             return JsonResponse({'error': 'Invalid email or password'}, status=401)
         
@@ -396,7 +565,7 @@ def manager_login(request):
 def get_managers_endpoint(request):
     """Retrieve all managers (for debugging or reference)."""
     try:
-        managers = list(managers_collection.find({}, {'_id': 0, 'password': 0}))
+        managers = list(get_db()['managers'].find({}, {'_id': 0, 'password': 0}))
         return JsonResponse({"managers": managers}, status=200)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -410,7 +579,7 @@ def get_developer_profile(request):
         if request.user_type != 'developer':
             return JsonResponse({'error': 'Unauthorized: Not a developer'}, status=403)
         
-        developer = developers_collection.find_one(
+        developer = get_db()['developers'].find_one(
             {'_id': ObjectId(request.user_id)},
             {'password': 0}
         )
@@ -463,12 +632,15 @@ def update_developer_profile(request):
         if not update_fields:
             return JsonResponse({'error': 'No valid fields provided for update'}, status=400)
         
-        result = developers_collection.update_one(
+        developer = get_db()['developers'].find_one_and_update(
             {'_id': ObjectId(request.user_id)},
-            {'$set': update_fields}
+            {'$set': update_fields},
+            projection=INDEX_FIELDS,
+            return_document=ReturnDocument.AFTER
         )
-        if result.matched_count == 0:
+        if developer is None:
             return JsonResponse({'error': 'Developer not found'}, status=404)
+        get_developer_index().upsert(developer)
         
         return JsonResponse({
             'status': 'success',
@@ -491,7 +663,7 @@ def get_manager_profile(request):
         if request.user_type != 'manager':
             return JsonResponse({'error': 'Unauthorized: Not a manager'}, status=403)
         
-        manager = managers_collection.find_one(
+        manager = get_db()['managers'].find_one(
             {'_id': ObjectId(request.user_id)},
             {'password': 0}
         )
@@ -531,7 +703,7 @@ def update_manager_profile(request):
         if not update_fields:
             return JsonResponse({'error': 'No valid fields provided for update'}, status=400)
         
-        result = managers_collection.update_one(
+        result = get_db()['managers'].update_one(
             {'_id': ObjectId(request.user_id)},
             {'$set': update_fields}
         )
@@ -561,15 +733,12 @@ def save_epics_stories(request):
         if not project_id or not epics_stories:
             return JsonResponse({"error": "Missing project_id or epics_stories"}, status=400)
         
-        client = get_mongo_client()
-        db = client[settings.MONGO_DB_NAME]
-        collection = db['project_epics_stories']  # New collection for epics and stories
+        collection = get_db()['project_epics_stories']  # New collection for epics and stories
         collection.update_one(
             {"project_id": project_id},
             {"$set": {"epics_stories": epics_stories, "updated_at": datetime.datetime.utcnow()}},
             upsert=True
         )
-        client.close()
         return JsonResponse({"status": "success"}, status=200)
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON format"}, status=400)
@@ -71,6 +71,43 @@ DATABASES = {
 # MongoDB settings
 MONGO_URI = os.getenv('MONGO_URI')
 MONGO_DB_NAME = 'agentic_db'
+# Shared client pool (see agentic_app/utils/db.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+
+# RAG sentence encoder: 'torch', 'torch-int8', 'onnx' or 'onnx-int8' (see agentic_app/utils/encoders.py)
+RAG_ENCODER_BACKEND = os.getenv('RAG_ENCODER_BACKEND', 'torch')
+# RAG index backend: 'flat', 'ivf_flat', 'ivf_pq' or 'hnsw' (see agentic_app/utils/rag.py)
+RAG_INDEX_TYPE = os.getenv('RAG_INDEX_TYPE', 'flat')
+RAG_IVF_NLIST = int(os.getenv('RAG_IVF_NLIST', '256'))
+RAG_IVF_NPROBE = int(os.getenv('RAG_IVF_NPROBE', '8'))
+RAG_PQ_M = int(os.getenv('RAG_PQ_M', '16'))
+RAG_PQ_NBITS = int(os.getenv('RAG_PQ_NBITS', '8'))
+RAG_HNSW_M = int(os.getenv('RAG_HNSW_M', '32'))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv('RAG_HNSW_EF_CONSTRUCTION', '200'))
+RAG_HNSW_EF_SEARCH = int(os.getenv('RAG_HNSW_EF_SEARCH', '64'))
+# Streaming ingestion: chunking, embedding batch size and IVF training sample cap
+RAG_CHUNK_SIZE = int(os.getenv('RAG_CHUNK_SIZE', '500'))
+RAG_CHUNK_OVERLAP = int(os.getenv('RAG_CHUNK_OVERLAP', '50'))
+RAG_EMBED_BATCH_SIZE = int(os.getenv('RAG_EMBED_BATCH_SIZE', '64'))
+RAG_TRAIN_SAMPLE_SIZE = int(os.getenv('RAG_TRAIN_SAMPLE_SIZE', '50000'))
+# Source PDF for the default playbook index, built in the background on first use
+RAG_PLAYBOOK_PDF = os.getenv('RAG_PLAYBOOK_PDF', 'data/08.031.17-Agile-Playbook-2.1-v12-One-Per-Student.pdf')
+# After a failed background build, wait this long before starting another (seconds)
+RAG_REBUILD_RETRY_SECONDS = int(os.getenv('RAG_REBUILD_RETRY_SECONDS', '300'))
+# Versioned index builds: how many versions to keep under rag_store/ and how often
+# workers check for a version published by another process (seconds)
+RAG_KEEP_VERSIONS = int(os.getenv('RAG_KEEP_VERSIONS', '3'))
+RAG_RELOAD_CHECK_SECONDS = float(os.getenv('RAG_RELOAD_CHECK_SECONDS', '5'))
+# Search result cache (entries, seconds); 0 entries disables it
+RAG_QUERY_CACHE_SIZE = int(os.getenv('RAG_QUERY_CACHE_SIZE', '1024'))
+RAG_QUERY_CACHE_TTL = int(os.getenv('RAG_QUERY_CACHE_TTL', '3600'))
+# Processes used to extract PDF pages during multi-document ingestion (0 = one per CPU)
+RAG_INGEST_WORKERS = int(os.getenv('RAG_INGEST_WORKERS', '0'))
 
 # JWT settings
 JWT_ALGORITHM = 'HS256'
@@ -86,6 +123,62 @@ GOOGLE_CREDENTIALS_PATH = BASE_DIR / 'credentials.json'
 
 # Gemini API key
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Shared Gemini clients: max in-flight calls per model per process, and how long
+# a call may wait for a free slot (seconds)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '120'))
+# Per-model, per-process rate limit on LLM calls (calls per minute, 0 = unlimited)
+LLM_RATE_LIMIT_PER_MINUTE = float(os.getenv('LLM_RATE_LIMIT_PER_MINUTE', '0'))
+LLM_RATE_LIMIT_BURST = int(os.getenv('LLM_RATE_LIMIT_BURST', '1'))
+# LLM response cache keyed by (model, temperature, prompt): in-process LRU size,
+# and how long entries live in memory and in the Mongo llm_cache collection (seconds)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '256'))
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '86400'))
+# How long a request waits on an identical in-flight LLM call before giving up (seconds)
+LLM_SINGLE_FLIGHT_TIMEOUT = float(os.getenv('LLM_SINGLE_FLIGHT_TIMEOUT', '180'))
+# Also coalesce identical calls across worker processes, through a lease in MongoDB
+# (the result is shared through the llm_cache collection, so this needs the cache)
+LLM_SINGLE_FLIGHT_ACROSS_PROCESSES = os.getenv('LLM_SINGLE_FLIGHT_ACROSS_PROCESSES', 'true').lower() == 'true'
+# Count prompt tokens with the Gemini API instead of estimating (~4 chars/token)
+LLM_EXACT_TOKEN_COUNT = os.getenv('LLM_EXACT_TOKEN_COUNT', 'false').lower() == 'true'
+# Team matcher prompts: token budget per prompt, and candidate developers per story
+TEAM_MATCHER_PROMPT_TOKEN_BUDGET = int(os.getenv('TEAM_MATCHER_PROMPT_TOKEN_BUDGET', '6000'))
+TEAM_MATCHER_SHORTLIST_SIZE = int(os.getenv('TEAM_MATCHER_SHORTLIST_SIZE', '8'))
+# Team matcher allocation: 'solver' (deterministic NumPy/SciPy assignment) or 'llm';
+# with the solver, optionally have the LLM write the reason text
+TEAM_MATCHER_MODE = os.getenv('TEAM_MATCHER_MODE', 'solver')
+TEAM_MATCHER_LLM_REASONS = os.getenv('TEAM_MATCHER_LLM_REASONS', 'false').lower() == 'true'
+# Stories a full-bandwidth developer can take in one allocation
+TEAM_MATCHER_STORIES_PER_DEVELOPER = int(os.getenv('TEAM_MATCHER_STORIES_PER_DEVELOPER', '1'))
+# Re-assignment rounds when developers are reserved by a concurrent allocation
+TEAM_MATCHER_RESERVATION_RETRIES = int(os.getenv('TEAM_MATCHER_RESERVATION_RETRIES', '3'))
+# Full reload interval of the in-memory developer skill index (seconds; 0 disables),
+# to pick up profile changes made by other worker processes; availability is
+# always read from MongoDB
+SKILL_INDEX_REFRESH_SECONDS = int(os.getenv('SKILL_INDEX_REFRESH_SECONDS', '300'))
+# Match stories to skills by embedding similarity (RAG encoder), not only literal
+# mentions; embeddings are cached by content hash, this many in process
+TEAM_MATCHER_SEMANTIC = os.getenv('TEAM_MATCHER_SEMANTIC', 'true').lower() == 'true'
+# Cosine similarity at or below which a story and a developer's skills count as
+# unrelated; higher similarities are rescaled to (0, 1]
+TEAM_MATCHER_SEMANTIC_FLOOR = float(os.getenv('TEAM_MATCHER_SEMANTIC_FLOOR', '0.5'))
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '50000'))
+# Idea agent: write the Markdown use-case map after responding (the analysis is
+# always saved first), on this many background threads per process
+IDEA_ASYNC_SIDE_EFFECTS = os.getenv('IDEA_ASYNC_SIDE_EFFECTS', 'true').lower() == 'true'
+IDEA_SIDE_EFFECT_WORKERS = int(os.getenv('IDEA_SIDE_EFFECT_WORKERS', '4'))
+# Async jobs (requests sent with Prefer: respond-async): job threads started in each
+# web process (0 to leave jobs to `manage.py run_job_worker`), default and maximum
+# run time per job, how long finished jobs are kept, and when a job whose worker
+# stopped heartbeating is requeued (seconds), up to JOBS_MAX_ATTEMPTS runs
+JOBS_LOCAL_WORKERS = int(os.getenv('JOBS_LOCAL_WORKERS', '2'))
+JOBS_DEFAULT_TIMEOUT = float(os.getenv('JOBS_DEFAULT_TIMEOUT', '600'))
+JOBS_MAX_TIMEOUT = float(os.getenv('JOBS_MAX_TIMEOUT', '3600'))
+JOBS_RESULT_TTL = int(os.getenv('JOBS_RESULT_TTL', '604800'))
+JOBS_HEARTBEAT_TIMEOUT = float(os.getenv('JOBS_HEARTBEAT_TIMEOUT', '60'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '2'))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1'))
 
 # SMTP settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'